@@ -0,0 +1,71 @@
+"""
+Rutas async sobre la lógica síncrona existente.
+
+Las rutas de productos, ventas y retiros se declaran con ``@ruta_async`` y
+reciben una ``AsyncSession`` (aiomysql / aiosqlite, ver database.py). El
+cuerpo de la ruta sigue siendo el mismo código síncrono: se ejecuta con
+``AsyncSession.run_sync``, de modo que el I/O de la base no ocupa un hilo
+del threadpool y las consultas no se duplican en dos versiones. Sin engine
+async ``get_sesion`` entrega la sesión síncrona y la ruta corre en el
+threadpool como antes.
+
+La respuesta se valida contra el esquema dentro de la misma llamada: fuera
+de ella las relaciones aún no cargadas no podrían leerse de forma perezosa.
+
+El cuerpo corre en el hilo del event loop y no debe esperar locks de hilos
+que se mantienen por más que un instante (el del índice de búsqueda): lo que
+los necesite va en ``preparar``, que corre en el threadpool antes del cuerpo
+(p. ej. crear_venta resuelve ahí los códigos de barras con el índice).
+"""
+
+import functools
+import inspect
+
+from fastapi import Depends, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from database import get_sesion
+
+
+async def ejecutar(db, funcion, *args, **kwargs):
+    """Ejecutar funcion(sesion, ...) con la sesión síncrona subyacente"""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(funcion, *args, **kwargs)
+    return await run_in_threadpool(funcion, db, *args, **kwargs)
+
+
+def ruta_async(esquema=None, dependencia=get_sesion, preparar=None):
+    """Convertir una ruta síncrona con parámetro ``db`` en una ruta async.
+
+    ``esquema`` es el mismo response_model de la ruta; los objetos Response
+    (p. ej. listados con headers o 304) se devuelven tal cual. ``dependencia``
+    permite leer de otra base (ver lectura.get_sesion_lectura). ``preparar``
+    recibe los mismos argumentos que la ruta (sin ``db``) y corre en el
+    threadpool antes del cuerpo.
+    """
+    adaptador = TypeAdapter(esquema) if esquema is not None else None
+
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        def llamar(sesion, args, kwargs):
+            resultado = funcion(*args, db=sesion, **kwargs)
+            if adaptador is None or resultado is None or isinstance(resultado, Response):
+                return resultado
+            return adaptador.validate_python(resultado, from_attributes=True)
+
+        @functools.wraps(funcion)
+        async def ruta(*args, db, **kwargs):
+            if preparar is not None:
+                await run_in_threadpool(preparar, *args, **kwargs)
+            return await ejecutar(db, llamar, args, kwargs)
+
+        ruta.__signature__ = firma.replace(parameters=[
+            parametro.replace(default=Depends(dependencia)) if parametro.name == "db" else parametro
+            for parametro in firma.parameters.values()
+        ])
+        return ruta
+
+    return decorador
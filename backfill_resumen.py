@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Reconstruir la tabla resumen_diario desde las ventas y retiros existentes.
+
+La migración 6 (migraciones.py) lo hace una vez al desplegar; este comando
+sirve para reconciliar si se cargaron ventas directamente en la base:
+    python backfill_resumen.py
+"""
+
+import sys
+import migraciones
+from database import engine, SessionLocal
+import resumen
+
+def main():
+    print("🔄 Reconstruyendo resumen diario de ventas y retiros...")
+    migraciones.migrar(engine)
+    
+    db = SessionLocal()
+    try:
+        filas = resumen.reconstruir(db)
+        print(f"✅ Resumen diario reconstruido: {filas} filas")
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error reconstruyendo resumen: {e}")
+        return 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
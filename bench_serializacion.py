@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark del listado de productos: costo de consulta + serialización por cada 1.000 productos.
+
+Compara el camino anterior de GET /api/productos (objetos ORM -> validación
+Pydantic de ProductoResponse -> json estándar) con el actual (tuplas de las
+columnas pedidas -> orjson), con todas las columnas y con la proyección que
+usa la grilla del POS. Usa una base SQLite temporal, no toca botilleria.db:
+    python bench_serializacion.py [cantidad_productos]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ.setdefault("DEBUG", "false")
+
+from pydantic import TypeAdapter
+import models
+import schemas
+import serializacion
+from database import engine, SessionLocal
+
+CAMPOS_POS = "id,codigo,nombre,precio_venta,stock,categoria"
+REPETICIONES = 20
+
+
+def poblar(db, cantidad: int):
+    db.bulk_insert_mappings(models.Producto, [
+        {
+            "codigo": f"BENCH{i:06d}", "nombre": f"Producto de prueba {i}", "descripcion": "Botella 750cc",
+            "precio_compra": 1000 + i, "precio_venta": 1500 + i, "stock": i % 50, "stock_minimo": 5,
+            "categoria": "Licores", "marca": "Marca", "litros": 0.75, "activo": True,
+        }
+        for i in range(cantidad)
+    ])
+    db.commit()
+
+
+def anterior(db) -> bytes:
+    """ORM + ProductoResponse + json estándar (lo que hacía response_model)"""
+    adaptador = TypeAdapter(List[schemas.ProductoResponse])
+    productos = adaptador.validate_python(db.query(models.Producto).order_by(models.Producto.id).all(), from_attributes=True)
+    return json.dumps(adaptador.dump_python(productos, mode="json")).encode("utf-8")
+
+
+def rapido(db, fields=None) -> bytes:
+    columnas = serializacion.columnas(models.Producto, schemas.ProductoResponse, fields)
+    return serializacion.dumps(serializacion.filas(columnas, db.query(*columnas).order_by(models.Producto.id).all()))
+
+
+def medir(nombre: str, funcion, cantidad: int):
+    db = SessionLocal()
+    try:
+        funcion(db)  # calentar
+        inicio = time.perf_counter()
+        for _ in range(REPETICIONES):
+            cuerpo = funcion(db)
+            db.expunge_all()
+        transcurrido = (time.perf_counter() - inicio) / REPETICIONES
+    finally:
+        db.close()
+    por_mil = transcurrido * 1000 / cantidad * 1000
+    print(f"{nombre:<62} {por_mil:8.2f} ms / 1k productos   {len(cuerpo) / cantidad:7.1f} bytes/producto")
+    return por_mil
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    poblar(db, cantidad)
+    db.close()
+
+    print(f"📊 {cantidad} productos, promedio de {REPETICIONES} repeticiones (orjson: {'sí' if serializacion.orjson else 'no'})")
+    base = medir("ORM + Pydantic + json (anterior)", anterior, cantidad)
+    todas = medir("tuplas + orjson, todas las columnas", rapido, cantidad)
+    pos = medir(f"tuplas + orjson, fields={CAMPOS_POS}", lambda db: rapido(db, CAMPOS_POS), cantidad)
+    print(f"⚡ {base / todas:.1f}x más rápido con todas las columnas, {base / pos:.1f}x con la proyección del POS")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
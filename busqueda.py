@@ -0,0 +1,442 @@
+"""
+Índice de búsqueda de productos en memoria.
+
+Reemplaza el ``LIKE '%q%'`` (que recorre toda la tabla en cada tecla) por un
+índice de trigramas por proceso, que funciona igual en SQLite y en MySQL:
+
+- sin distinción de mayúsculas ni acentos ("pina" encuentra "Piña");
+- busca en código, nombre, marca y categoría;
+- prioriza coincidencias exactas/prefijo de código y luego prefijo de nombre.
+
+También resuelve códigos de barras exactos (``por_codigo``) para el escaneo
+en caja, con el id, precio y stock del producto.
+
+Para el autocompletado del POS mantiene además un diccionario de borrados
+al estilo SymSpell sobre las palabras de código, nombre y marca, que tolera
+errores de tipeo ("heinekn", "absolu") hasta ``MAX_DISTANCIA`` ediciones.
+Los códigos numéricos (EAN) quedan fuera de ese diccionario: comparten casi
+todos el mismo prefijo ("780...") y solo se autocompletan por prefijo exacto.
+
+El índice se carga al iniciar la aplicación y se mantiene al día con el
+cursor del catálogo (ver catalogo.py): un hilo en segundo plano trae cada
+``REFRESCO_SEGUNDOS`` solo los productos que cambiaron, y las escrituras del
+propio proceso llaman a ``invalidar()`` para que el hilo sincronice de
+inmediato. Las consultas nunca tocan la base de datos.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from itertools import combinations
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+import catalogo
+
+# Cada cuánto se consulta el cursor del catálogo para traer cambios de otros procesos
+REFRESCO_SEGUNDOS = 2.0
+
+# Consultas recientes que se guardan ya resueltas (se vacían con cada cambio del índice)
+MAX_RESULTADOS_EN_CACHE = 1000
+
+# Sugerencias: ediciones toleradas y largo del prefijo con que se indexa cada palabra
+MAX_DISTANCIA = 2
+LARGO_PREFIJO = 7
+# Palabras que se comparan por término de la consulta (acota el costo de una sugerencia)
+MAX_CANDIDATOS = 200
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS = (
+    models.Producto.id,
+    models.Producto.codigo,
+    models.Producto.nombre,
+    models.Producto.marca,
+    models.Producto.categoria,
+    models.Producto.precio_venta,
+    models.Producto.stock,
+    models.Producto.activo,
+)
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """Minúsculas y sin acentos: 'Piña Colada' -> 'pina colada'"""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_acentos.lower().split())
+
+
+def _claves(token: str) -> set:
+    """Trigramas del token más sus prefijos de 1 y 2 letras (para consultas cortas)"""
+    claves = {"^" + token[:1], "^" + token[:2]}
+    claves.update(token[i:i + 3] for i in range(len(token) - 2))
+    return claves
+
+
+def _claves_termino(termino: str) -> set:
+    if len(termino) < 3:
+        return {"^" + termino}
+    return {termino[i:i + 3] for i in range(len(termino) - 2)}
+
+
+def _tolera_errores(palabra: str) -> bool:
+    """Las palabras numéricas (códigos de barras) no se buscan con errores de tipeo"""
+    return not palabra.isdigit()
+
+
+def _borrados(palabra: str, distancia: int = MAX_DISTANCIA) -> set:
+    """La palabra y todas las variantes con hasta `distancia` letras borradas"""
+    variantes = {palabra}
+    for n in range(1, min(distancia, len(palabra) - 1) + 1):
+        for posiciones in combinations(range(len(palabra)), n):
+            variantes.add("".join(c for i, c in enumerate(palabra) if i not in posiciones))
+    return variantes
+
+
+def distancia_edicion(a: str, b: str, maximo: int = MAX_DISTANCIA) -> int:
+    """Distancia de Damerau-Levenshtein (transposiciones adyacentes), cortando sobre `maximo`"""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            costo = 0 if a[i - 1] == b[j - 1] else 1
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, actual
+    return anterior[-1]
+
+
+def _distancia_prefijo(termino: str, palabra: str) -> int:
+    """Cuánto le falta a `termino` para ser el comienzo de `palabra` (autocompletado)"""
+    largo = len(termino)
+    return min(
+        distancia_edicion(termino, palabra[:k])
+        for k in range(max(1, largo - MAX_DISTANCIA), largo + MAX_DISTANCIA + 1)
+    )
+
+
+class IndiceProductos:
+    """Índice invertido de trigramas sobre los productos activos"""
+
+    # Estructuras que se reemplazan juntas al recargar el índice completo
+    _ESTRUCTURAS = (
+        "productos", "_textos", "_postings", "_resultados",
+        "_por_codigo", "_palabras", "_vocabulario", "_variantes"
+    )
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Un solo hilo consultando la base para sincronizar (las búsquedas no lo esperan)
+        self._lock_sincronizar = threading.Lock()
+        self.productos = {}  # id -> dict con los campos de ProductoSearch
+        self._textos = {}  # id -> (codigo, nombre, tokens, texto) normalizados
+        self._postings = defaultdict(set)  # clave -> ids
+        self._resultados = {}  # (consulta, limite) -> resultado; se vacía con cada cambio
+        self._por_codigo = {}  # código normalizado -> id (escaneo de código de barras)
+        self._palabras = defaultdict(set)  # palabra de código/nombre/marca -> ids
+        self._vocabulario = []  # palabras ordenadas, para autocompletar por prefijo
+        self._variantes = defaultdict(set)  # borrado del prefijo de una palabra -> palabras
+        self.cursor = None
+        self._sincronizado_en = 0.0
+        self._despertar = threading.Event()
+        self._hilo = None
+
+    # ---------- mantenimiento ----------
+
+    def _agregar_palabra(self, palabra: str, producto_id: int) -> None:
+        if palabra not in self._palabras:
+            bisect.insort(self._vocabulario, palabra)
+            if _tolera_errores(palabra):
+                for variante in _borrados(palabra[:LARGO_PREFIJO]):
+                    self._variantes[variante].add(palabra)
+        self._palabras[palabra].add(producto_id)
+
+    def _quitar_palabra(self, palabra: str, producto_id: int) -> None:
+        ids = self._palabras.get(palabra)
+        if ids is None:
+            return
+        ids.discard(producto_id)
+        if ids:
+            return
+        del self._palabras[palabra]
+        del self._vocabulario[bisect.bisect_left(self._vocabulario, palabra)]
+        if not _tolera_errores(palabra):
+            return
+        for variante in _borrados(palabra[:LARGO_PREFIJO]):
+            palabras = self._variantes.get(variante)
+            if palabras is not None:
+                palabras.discard(palabra)
+                if not palabras:
+                    del self._variantes[variante]
+
+    def _quitar(self, producto_id: int) -> None:
+        self._resultados.clear()
+        texto = self._textos.pop(producto_id, None)
+        self.productos.pop(producto_id, None)
+        if texto is None:
+            return
+        if self._por_codigo.get(texto[0]) == producto_id:
+            del self._por_codigo[texto[0]]
+        for token in texto[2]:
+            for clave in _claves(token):
+                ids = self._postings.get(clave)
+                if ids is not None:
+                    ids.discard(producto_id)
+                    if not ids:
+                        del self._postings[clave]
+        for palabra in texto[4]:
+            self._quitar_palabra(palabra, producto_id)
+
+    def _poner(self, fila) -> None:
+        datos = dict(fila._mapping)
+        if not datos.pop("activo"):
+            self._quitar(datos["id"])
+            return
+
+        codigo = normalizar(datos["codigo"])
+        nombre = normalizar(datos["nombre"])
+        palabras = tuple(dict.fromkeys(f"{codigo} {nombre} {normalizar(datos['marca'])}".split()))
+        tokens = tuple(dict.fromkeys(palabras + tuple(normalizar(datos["categoria"]).split())))
+
+        anterior = self._textos.get(datos["id"])
+        if anterior is None or anterior[2] != tokens:
+            # Solo se reindexa si cambió el texto; un cambio de stock/precio solo actualiza datos
+            self._quitar(datos["id"])
+            for token in tokens:
+                for clave in _claves(token):
+                    self._postings[clave].add(datos["id"])
+            for palabra in palabras:
+                self._agregar_palabra(palabra, datos["id"])
+        self._textos[datos["id"]] = (codigo, nombre, tokens, " " + " ".join(tokens), palabras)
+        self._por_codigo[codigo] = datos["id"]
+        self._resultados.clear()
+        self.productos[datos["id"]] = datos
+
+    def cargar(self, db: Session) -> None:
+        """Construir el índice completo (una consulta de columnas, sin objetos ORM).
+
+        Se arma en una instancia aparte sin tomar el lock; las búsquedas solo
+        esperan el reemplazo de las estructuras, no la consulta.
+        """
+        with self._lock_sincronizar:
+            cursor = catalogo.cursor_actual(db)
+            filas = db.execute(select(*COLUMNAS)).all()
+            nuevo = IndiceProductos()
+            for fila in filas:
+                nuevo._poner(fila)
+            with self._lock:
+                for atributo in self._ESTRUCTURAS:
+                    setattr(self, atributo, getattr(nuevo, atributo))
+                self.cursor = cursor
+                self._sincronizado_en = time.monotonic()
+
+    def sincronizar(self, db: Session, forzar: bool = False) -> None:
+        """Traer los productos que cambiaron desde el último cursor.
+
+        Con el hilo de refresco activo las consultas solo cargan el índice si
+        aún no existe; sin él, sincronizan como mucho cada REFRESCO_SEGUNDOS.
+        Las consultas a la base se hacen sin el lock de búsqueda.
+        """
+        if self.cursor is None:
+            self.cargar(db)
+            return
+        if not forzar and (
+            self._hilo is not None or time.monotonic() - self._sincronizado_en < REFRESCO_SEGUNDOS
+        ):
+            return
+
+        with self._lock_sincronizar:
+            hasta = catalogo.cursor_actual(db)
+            filas = []
+            if hasta != self.cursor:
+                ids = catalogo.productos_cambiados(db, self.cursor, hasta)
+                if ids:
+                    filas = db.execute(select(*COLUMNAS).where(models.Producto.id.in_(ids))).all()
+            with self._lock:
+                for fila in filas:
+                    self._poner(fila)
+                self.cursor = hasta
+                self._sincronizado_en = time.monotonic()
+
+    def invalidar(self) -> None:
+        """Sincronizar cuanto antes (tras una escritura de este proceso)"""
+        self._sincronizado_en = 0.0
+        self._despertar.set()
+
+    def iniciar(self, crear_sesion) -> None:
+        """Cargar el índice y mantenerlo al día desde un hilo en segundo plano"""
+        if self._hilo is not None:
+            return
+
+        def refrescar():
+            while True:
+                try:
+                    db = crear_sesion()
+                    try:
+                        self.sincronizar(db, forzar=True)
+                    finally:
+                        db.close()
+                except Exception as e:
+                    logger.error(f"❌ Error sincronizando índice de productos: {e}")
+                self._despertar.wait(REFRESCO_SEGUNDOS)
+                self._despertar.clear()
+
+        self._hilo = threading.Thread(target=refrescar, name="indice-productos", daemon=True)
+        self._hilo.start()
+
+    # ---------- consulta ----------
+
+    def por_codigo(self, codigo: str) -> Optional[dict]:
+        """Producto activo con ese código exacto (sin distinguir mayúsculas), sin ir a la base"""
+        with self._lock:
+            producto_id = self._por_codigo.get(normalizar(codigo))
+            return self.productos.get(producto_id) if producto_id is not None else None
+
+    def buscar(self, q: str, limite: int = 20) -> list:
+        """Productos que contienen todos los términos de q, ordenados por relevancia"""
+        consulta = normalizar(q)
+        terminos = consulta.split()
+        if not terminos:
+            return []
+
+        with self._lock:
+            # Las terminales repiten las mismas consultas cortas ("cer", "pis"...)
+            if (consulta, limite) in self._resultados:
+                return self._resultados[(consulta, limite)]
+
+            candidatos = None
+            for termino in sorted(terminos, key=len, reverse=True):
+                postings = sorted((self._postings.get(clave, set()) for clave in _claves_termino(termino)), key=len)
+                ids = set(postings[0]).intersection(*postings[1:]) if postings else set()
+                candidatos = ids if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return []
+
+            # Los trigramas pueden dar falsos positivos en términos de más de 3 letras
+            verificar = [t for t in terminos if len(t) > 3]
+            prefijos = [" " + t for t in terminos]
+
+            def rango(producto_id):
+                codigo, nombre, _, texto, _ = self._textos[producto_id]
+                if codigo == consulta:
+                    return (0, nombre, producto_id)
+                if codigo.startswith(consulta):
+                    return (1, nombre, producto_id)
+                if nombre.startswith(consulta):
+                    return (2, nombre, producto_id)
+                if all(p in texto for p in prefijos):
+                    return (3, nombre, producto_id)
+                return (4, nombre, producto_id)
+
+            coincidencias = (
+                producto_id for producto_id in candidatos
+                if all(t in self._textos[producto_id][3] for t in verificar)
+            )
+            mejores = heapq.nsmallest(limite, map(rango, coincidencias))
+            resultado = [self.productos[producto_id] for _, _, producto_id in mejores]
+            self._guardar_resultado((consulta, limite), resultado)
+            return resultado
+
+    def _guardar_resultado(self, clave, resultado) -> None:
+        if len(self._resultados) >= MAX_RESULTADOS_EN_CACHE:
+            self._resultados.clear()
+        self._resultados[clave] = resultado
+
+    def _candidatas(self, termino: str) -> tuple:
+        """Palabras con el prefijo exacto y palabras a medir por errores de tipeo (con el lock tomado)"""
+        # Prefijo exacto: búsqueda binaria en el vocabulario ordenado
+        exactas = []
+        posicion = bisect.bisect_left(self._vocabulario, termino)
+        while posicion < len(self._vocabulario) and len(exactas) < MAX_CANDIDATOS:
+            palabra = self._vocabulario[posicion]
+            if not palabra.startswith(termino):
+                break
+            exactas.append(palabra)
+            posicion += 1
+
+        # Con errores: variantes por borrado (SymSpell), solo para términos de largo útil;
+        # primero las de menos borrados, que dan las palabras más parecidas
+        a_medir = set()
+        if len(termino) >= LARGO_PREFIJO - MAX_DISTANCIA and _tolera_errores(termino):
+            for variante in sorted(_borrados(termino[:LARGO_PREFIJO]), key=len, reverse=True):
+                for palabra in self._variantes.get(variante, ()):
+                    if len(a_medir) >= MAX_CANDIDATOS:
+                        return exactas, a_medir
+                    a_medir.add(palabra)
+        return exactas, a_medir
+
+    @staticmethod
+    def _similares(termino: str, exactas: list, a_medir: set) -> dict:
+        """Palabras que empiezan como `termino` salvo errores de tipeo: {palabra: distancia}"""
+        similares = dict.fromkeys(exactas, 0)
+        prefijo = termino[:LARGO_PREFIJO]
+        for palabra in a_medir:
+            if palabra not in similares:
+                distancia = _distancia_prefijo(prefijo, palabra)
+                if distancia <= MAX_DISTANCIA:
+                    similares[palabra] = distancia
+        return similares
+
+    def sugerir(self, q: str, limite: int = 8) -> list:
+        """Productos cuyo código, nombre o marca se parecen a q, tolerando errores de tipeo.
+
+        Las candidatas se juntan con el lock tomado, pero las distancias se
+        calculan sin él: una sugerencia no demora búsquedas ni escaneos en caja.
+        """
+        terminos = normalizar(q).split()
+        if not terminos:
+            return []
+
+        clave = ("~" + " ".join(terminos), limite)
+        with self._lock:
+            if clave in self._resultados:
+                return self._resultados[clave]
+            candidatas = [self._candidatas(termino) for termino in terminos]
+
+        similares = [
+            self._similares(termino, exactas, a_medir)
+            for termino, (exactas, a_medir) in zip(terminos, candidatas)
+        ]
+
+        with self._lock:
+            # Cada término debe parecerse a alguna palabra del producto; se suma la mejor distancia
+            puntajes = None
+            for palabras in similares:
+                por_producto = {}
+                for palabra, distancia in palabras.items():
+                    for producto_id in self._palabras.get(palabra, ()):
+                        if distancia < por_producto.get(producto_id, MAX_DISTANCIA + 1):
+                            por_producto[producto_id] = distancia
+                if puntajes is None:
+                    puntajes = por_producto
+                else:
+                    puntajes = {
+                        producto_id: puntaje + por_producto[producto_id]
+                        for producto_id, puntaje in puntajes.items() if producto_id in por_producto
+                    }
+                if not puntajes:
+                    break
+
+            mejores = heapq.nsmallest(
+                limite, ((puntaje, self._textos[producto_id][1], producto_id) for producto_id, puntaje in puntajes.items())
+            )
+            resultado = [self.productos[producto_id] for _, _, producto_id in mejores]
+            self._guardar_resultado(clave, resultado)
+            return resultado
+
+
+# Índice compartido por el proceso
+indice = IndiceProductos()
@@ -0,0 +1,177 @@
+"""
+Versión del catálogo de productos para GET condicionales (ETag / 304) y
+sincronización incremental (GET /api/productos/changes).
+
+Todo cambio de un producto deja una fila:
+
+- los cambios de stock (ventas, retiros, reposiciones) en el ledger
+  ``stock_movements``;
+- las ediciones (alta, precio, nombre, baja) en ``producto_cambios``.
+
+Ambas llevan la versión del catálogo en que se publicaron. Durante la
+transacción las filas se insertan con una marca provisoria (negativa, al azar)
+sin tomar ningún lock; después del commit ``publicar`` abre una transacción
+corta que incrementa la única fila ``catalogo_version`` y cambia la marca por
+esa versión. Las publicaciones se serializan en el UPDATE de esa fila, así
+que quien lee la versión N ya puede ver todas las filas con versión <= N. Los
+ids autoincrementales no sirven de cursor porque se asignan al insertar, no
+al confirmar, y una transacción lenta podría confirmar un id menor que uno
+ya entregado.
+
+Si el proceso cae entre el commit y la publicación, las filas quedan con su
+marca y ``publicar_pendientes`` (lo llama compactar_stock) las publica.
+
+La versión actual es el cursor del catálogo: sirve para el ETag y permite
+responder "qué productos cambiaron desde X" con dos rangos sobre índices,
+sin recorrer la tabla de productos.
+"""
+
+import hashlib
+import logging
+import random
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select, union, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+# Filas de catalogo_version: la versión publicada y la barrera de compactar_stock
+FILA_VERSION = 1
+FILA_COMPACTACION = 2
+
+
+def cursor_actual(db: Session) -> int:
+    """Última versión publicada del catálogo"""
+    return db.scalar(select(models.VersionCatalogo.version).where(models.VersionCatalogo.id == FILA_VERSION)) or 0
+
+
+def incrementar(db: Session, fila: int) -> int:
+    """Incrementar un contador de catalogo_version; el lock de la fila dura hasta el commit"""
+    incremento = update(models.VersionCatalogo).where(models.VersionCatalogo.id == fila).values(
+        version=models.VersionCatalogo.version + 1
+    ).execution_options(synchronize_session=False)
+    if not db.execute(incremento).rowcount:
+        # Base sin la fila (la de la versión la crea la migración 5): crearla; si otra
+        # transacción la creó entretanto, incrementar la suya
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.VersionCatalogo).values(id=fila, version=1))
+        except IntegrityError:
+            db.execute(incremento)
+    return db.scalar(select(models.VersionCatalogo.version).where(models.VersionCatalogo.id == fila))
+
+
+def marca(db: Session) -> int:
+    """Marca provisoria de la transacción en curso (negativa, no bloquea a otras).
+
+    Queda pendiente en la sesión hasta que ``publicar`` la reemplace por una versión.
+    """
+    transaccion = db.get_transaction()
+    guardada = db.info.get("marca_catalogo")
+    if guardada is not None and guardada[0] is transaccion:
+        return guardada[1]
+
+    valor = -random.randint(1, 2**31 - 1)
+    db.info["marca_catalogo"] = (transaccion, valor)
+    db.info.setdefault("marcas_catalogo", set()).add(valor)
+    return valor
+
+
+def _sellar(db: Session, marcas=None) -> int:
+    """Cambiar por una versión nueva las marcas indicadas (todas las pendientes si no se indican)"""
+    version = incrementar(db, FILA_VERSION)
+    for modelo in (models.MovimientoStock, models.CambioProducto):
+        pendientes = modelo.version.in_(marcas) if marcas is not None else modelo.version < 0
+        db.execute(
+            update(modelo).where(pendientes).values(version=version)
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return version
+
+
+def publicar(db: Session) -> None:
+    """Publicar los cambios confirmados por la sesión (llamar después de db.commit()).
+
+    Transacción corta aparte: el lock de catalogo_version dura solo los dos
+    UPDATE por marca y su commit, no la venta completa. Si falla, los cambios
+    ya están confirmados; se publicarán con publicar_pendientes.
+    """
+    marcas = db.info.pop("marcas_catalogo", None)
+    db.info.pop("marca_catalogo", None)
+    if not marcas:
+        return
+    try:
+        _sellar(db, marcas)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error publicando cambios del catálogo: {e}")
+
+
+def publicar_pendientes(db: Session) -> int:
+    """Publicar las filas confirmadas que quedaron con marca provisoria; retorna la versión"""
+    return _sellar(db)
+
+
+def codificar_cursor(cursor: int) -> str:
+    return str(cursor)
+
+
+def decodificar_cursor(texto: str) -> Optional[int]:
+    """Cursor de una sincronización anterior; None si es del formato antiguo (ids), hay que recargar todo"""
+    if "." in texto:
+        return None
+    try:
+        return int(texto)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de sincronización inválido")
+
+
+def version(db: Session) -> str:
+    """Versión actual del catálogo (cambia con cualquier escritura de productos o stock).
+
+    Además del cursor incluye cantidad de productos y última creación/modificación,
+    que cubren cambios hechos directamente en la base por los scripts de carga.
+    """
+    fila = db.execute(select(
+        select(func.count(models.Producto.id)).scalar_subquery(),
+        select(func.max(models.Producto.created_at)).scalar_subquery(),
+        select(func.max(models.Producto.updated_at)).scalar_subquery(),
+    )).one()
+    return ":".join([codificar_cursor(cursor_actual(db)), *(str(valor) for valor in fila)])
+
+
+def registrar_cambio(db: Session, producto_id: int) -> None:
+    """Registrar la edición de un producto (se confirma con el commit del llamador y se publica después)"""
+    db.execute(insert(models.CambioProducto), [{"producto_id": producto_id, "version": marca(db)}])
+
+
+def productos_cambiados(db: Session, desde: int, hasta: int) -> list:
+    """Ids de productos con movimientos o ediciones en el rango de versiones (desde, hasta]"""
+    consulta = union(
+        select(models.MovimientoStock.producto_id).where(
+            models.MovimientoStock.version > desde, models.MovimientoStock.version <= hasta
+        ),
+        select(models.CambioProducto.producto_id).where(
+            models.CambioProducto.version > desde, models.CambioProducto.version <= hasta
+        ),
+    )
+    return [producto_id for (producto_id,) in db.execute(consulta)]
+
+
+def etag(db: Session, *partes) -> str:
+    """ETag de una respuesta del catálogo: versión + parámetros que cambian el contenido"""
+    contenido = "|".join([version(db), *(str(parte) for parte in partes)])
+    return '"' + hashlib.sha1(contenido.encode()).hexdigest()[:20] + '"'
+
+
+def coincide(if_none_match: Optional[str], etag_actual: str) -> bool:
+    """Evaluar el header If-None-Match contra el ETag actual"""
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip().removeprefix("W/") for valor in if_none_match.split(",")]
+    return "*" in candidatos or etag_actual in candidatos
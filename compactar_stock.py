@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Compactar el ledger de inventario (stock_movements) en stock_snapshots.
+
+Pensado para ejecutarse periódicamente (por ejemplo un cron diario en Railway):
+    python compactar_stock.py
+"""
+
+import sys
+import migraciones
+from database import engine, SessionLocal
+import inventario
+
+def main():
+    print("🔄 Compactando ledger de stock...")
+    migraciones.migrar(engine)
+    
+    db = SessionLocal()
+    try:
+        resultado = inventario.compactar_stock(db)
+        print(f"✅ Líneas base creadas: {resultado['lineas_base']}")
+        print(f"✅ Snapshots nuevos: {resultado['snapshots']} (hasta movimiento {resultado['movimiento_id']})")
+        
+        if resultado["diferencias"]:
+            print(f"⚠️ {len(resultado['diferencias'])} productos con stock distinto al ledger:")
+            for diferencia in resultado["diferencias"]:
+                print(f"   Producto {diferencia['producto_id']}: ledger={diferencia['ledger']} stock={diferencia['stock']}")
+            return 1
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error compactando stock: {e}")
+        return 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -37,9 +37,41 @@ class Settings(BaseSettings):
             # Fallback para desarrollo local
             return "sqlite:///./botilleria.db"
     
+    # SQLite en producción (tiendas pequeñas): WAL + pool de lectura
+    sqlite_pool_size: int = 8
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size_mb: int = 256
+    sqlite_cache_size_mb: int = 20
+    
+    # Rutas de productos/ventas/retiros con AsyncSession (aiomysql / aiosqlite).
+    # None = automático: solo MySQL y si aiomysql está instalado; si no, sesión síncrona.
+    async_db: Optional[bool] = None
+    
+    # Lecturas pesadas (historial, estadísticas, reportes, exportaciones) fuera del engine de escritura:
+    # READ_DATABASE_URL apunta a una réplica de solo lectura; en SQLite, sin réplica, se puede
+    # leer de una copia que se toma cada SQLITE_SNAPSHOT_SECONDS con la API de backup (0 = desactivado)
+    read_database_url: Optional[str] = None
+    sqlite_snapshot_seconds: int = 0
+    sqlite_snapshot_path: Optional[str] = None
+    
     # App
     app_name: str = "Botillería System"
-    debug: bool = True
+    # True registra cada sentencia SQL y recarga los archivos estáticos (solo desarrollo)
+    debug: bool = False
+    
+    # Aplicar migraciones pendientes al iniciar cada worker; con False se corren aparte
+    # (python migraciones.py) y el worker no abre conexiones a la base al arrancar
+    migrar_al_iniciar: bool = True
+    
+    # Horas que se recuerda un Idempotency-Key de POST /api/ventas y /api/retiros
+    idempotency_ttl_hours: int = 24
+    
+    # Tamaño máximo de página de los listados (GET /api/productos, /api/ventas, /api/retiros)
+    max_page_productos: int = 1000
+    max_page_historial: int = 200
+    
+    # Segundos que se reutilizan las estadísticas del dashboard (se invalidan al escribir)
+    stats_cache_ttl_seconds: float = 5.0
     
     class Config:
         env_file = ".env"
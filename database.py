@@ -1,4 +1,11 @@
-from sqlalchemy import create_engine
+import importlib.util
+import re
+import sqlite3
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import get_settings
@@ -6,25 +13,119 @@ from config import get_settings
 settings = get_settings()
 
 # Crear engine de SQLAlchemy (MySQL en Railway o SQLite local)
-database_url = settings.get_database_url()
+def normalizar_url(url: str) -> str:
+    # Si es MySQL, forzar el uso de PyMySQL como driver
+    if url.startswith('mysql://'):
+        return url.replace('mysql://', 'mysql+pymysql://', 1)
+    return url
+
 
-# Si es MySQL, forzar el uso de PyMySQL como driver
-if database_url.startswith('mysql://'):
-    database_url = database_url.replace('mysql://', 'mysql+pymysql://', 1)
+database_url = normalizar_url(settings.get_database_url())
 
 print(f"🔗 Conectando a: {database_url.split('@')[0]}@[HOST_HIDDEN]" if '@' in database_url else database_url)
 
+es_sqlite = database_url.startswith("sqlite")
+
+# ============== PERFIL DE PRODUCCIÓN SQLITE ==============
+# WAL permite leer mientras otro escribe; un solo escritor a la vez por proceso
+# (lock en Python) evita que las transacciones compitan por el lock de SQLite
+# y terminen en "database is locked".
+
+_ESCRITURA = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+_lock_escritura = threading.Lock()
+perfil_sqlite = es_sqlite and ":memory:" not in database_url
+
+
+class _ConexionSQLite(sqlite3.Connection):
+    """Conexión que suelta el lock de escritura cuando SQLite ya terminó el COMMIT/ROLLBACK.
+
+    Los eventos commit/rollback del engine se disparan antes de llegar al
+    driver: soltar el lock ahí dejaba entrar al siguiente escritor mientras
+    esta conexión aún tenía el lock de SQLite.
+    """
+    escribiendo = False
+
+    def tomar_escritura(self) -> None:
+        if not self.escribiendo:
+            _lock_escritura.acquire()
+            self.escribiendo = True
+
+    def _liberar(self) -> None:
+        if self.escribiendo:
+            self.escribiendo = False
+            _lock_escritura.release()
+
+    def commit(self):
+        # Si el COMMIT falla la transacción sigue abierta: el lock se suelta con el rollback
+        super().commit()
+        self._liberar()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._liberar()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._liberar()
+
+
+def _connect_args() -> dict:
+    if not es_sqlite:
+        return {}
+    args = {"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000}
+    if perfil_sqlite:
+        args["factory"] = _ConexionSQLite
+    return args
+
+
 engine = create_engine(
     database_url,
     pool_pre_ping=True,
     pool_recycle=3600,
-    pool_size=20 if 'mysql' in database_url else 1,
+    # SQLite en WAL: varias conexiones de lectura en paralelo, las escrituras se serializan abajo
+    pool_size=20 if 'mysql' in database_url else settings.sqlite_pool_size,
     max_overflow=30 if 'mysql' in database_url else 0,
     echo=settings.debug,
     # Configuraciones específicas para SQLite si es necesario
-    connect_args={"check_same_thread": False} if "sqlite" in database_url else {},
+    connect_args=_connect_args(),
 )
 
+
+def _pragmas_sqlite(conexion_dbapi, _registro):
+    cursor = conexion_dbapi.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_mb) * 1024 * 1024}")
+    # cache_size negativo = KiB por conexión
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_mb) * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+if perfil_sqlite:
+    event.listen(engine, "connect", _pragmas_sqlite)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _tomar_escritura(conexion, _cursor, sentencia, _parametros, _contexto, _executemany):
+        if _ESCRITURA.match(sentencia):
+            conexion.connection.dbapi_connection.tomar_escritura()
+
+def tomar_escritura(db) -> None:
+    """Tomar ya el lock de escritura del proceso (SQLite no tiene SELECT ... FOR UPDATE).
+
+    Para lecturas que deben seguir valiendo hasta el commit; se suelta con el
+    commit/rollback de la conexión. Sin perfil SQLite (o con aiosqlite) no hace nada.
+    """
+    if perfil_sqlite:
+        conexion = db.connection().connection.dbapi_connection
+        if isinstance(conexion, _ConexionSQLite):
+            conexion.tomar_escritura()
+
 # Session local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -38,3 +139,71 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ============== ENGINE ASYNC ==============
+# Las rutas de productos, ventas y retiros usan AsyncSession cuando hay driver
+# async; si no, get_sesion entrega la sesión síncrona de siempre.
+#
+# El lock de escritura de SQLite no se aplica al engine async: sus sentencias
+# se ejecutan desde el event loop y esperar un threading.Lock ahí detendría
+# todas las peticiones. Con aiosqlite las escrituras async solo esperan vía
+# busy_timeout y, bajo carga, una transacción que pasa de lectura a escritura
+# puede fallar con "database is locked". Por eso en SQLite el modo async no se
+# activa solo (ASYNC_DB=true); en MySQL los locks de fila de InnoDB bastan.
+
+def _url_async(url: str):
+    if url.startswith("mysql+pymysql://"):
+        return url.replace("mysql+pymysql://", "mysql+aiomysql://", 1), "aiomysql"
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1), "aiosqlite"
+    return None, None
+
+
+def _usar_async() -> bool:
+    url, driver = _url_async(database_url)
+    if url is None or settings.async_db is False:
+        return False
+    if settings.async_db is None and driver != "aiomysql":
+        # SQLite async pierde el lock de escritura en proceso: solo si se pide explícitamente
+        return False
+    if driver == "aiosqlite":
+        print("⚠️ SQLite async: las escrituras de rutas async no usan el lock de escritura (ver database.py)")
+    if importlib.util.find_spec(driver) is None:
+        print(f"⚠️ {driver} no está instalado, se usa la sesión síncrona")
+        return False
+    return True
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if _usar_async():
+    async_engine = create_async_engine(
+        _url_async(database_url)[0],
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        pool_size=20 if not es_sqlite else settings.sqlite_pool_size,
+        max_overflow=30 if not es_sqlite else 0,
+        # aiosqlite usa NullPool por defecto: reutilizar conexiones como el engine síncrono
+        poolclass=AsyncAdaptedQueuePool if es_sqlite else None,
+        echo=settings.debug,
+        connect_args={"timeout": settings.sqlite_busy_timeout_ms / 1000} if es_sqlite else {},
+    )
+    if es_sqlite and ":memory:" not in database_url:
+        event.listen(async_engine.sync_engine, "connect", _pragmas_sqlite)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+    print(f"⚡ Sesiones async con {async_engine.dialect.driver}")
+
+
+async def get_sesion():
+    """AsyncSession si el engine async está activo; si no, la sesión síncrona"""
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,92 @@
+"""
+Estadísticas del dashboard (/api/estadisticas) con cache en memoria.
+
+Todas las pestañas del POS consultan las estadísticas cada pocos segundos;
+el resultado se guarda en memoria y se invalida cuando se confirma una
+venta, un retiro o un cambio de productos. Si varias peticiones encuentran
+el cache vacío a la vez, solo una lo calcula y las demás esperan su
+resultado (single-flight). El TTL acota lo desactualizado que puede estar un
+worker cuando la escritura ocurrió en otro proceso.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+import models
+import resumen
+from config import get_settings
+
+
+def calcular(db: Session) -> dict:
+    """Estadísticas del día: resumen diario + dos consultas sobre productos y ventas"""
+    dia = resumen.del_dia(db, resumen.fecha_de())
+
+    # Total de productos activos y con stock bajo en una sola consulta
+    total_productos, productos_bajo_stock = db.query(
+        func.count(models.Producto.id),
+        func.sum(case((models.Producto.stock < models.Producto.stock_minimo, 1), else_=0))
+    ).filter(models.Producto.activo == True).one()
+
+    # Última venta (índice created_at, id)
+    ultima_venta = db.query(models.Venta.created_at).order_by(
+        models.Venta.created_at.desc(), models.Venta.id.desc()
+    ).first()
+
+    return {
+        "ventas_hoy": dia["ventas"],
+        "retiros_hoy": dia["retiros"],
+        "utilidad_neta": dia["ventas"] - dia["retiros"],
+        "cantidad_ventas_hoy": dia["cantidad_ventas"],
+        "ventas_hoy_por_metodo_pago": dia["por_metodo_pago"],
+        "total_productos": total_productos or 0,
+        "productos_bajo_stock": int(productos_bajo_stock or 0),
+        "ultima_venta": ultima_venta.created_at if ultima_venta else None
+    }
+
+
+class CacheEstadisticas:
+    """Último resultado con TTL; las peticiones concurrentes comparten un solo cálculo"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._valor: Optional[dict] = None
+        self._expira = 0.0
+        self._version = 0
+        self._en_curso: Optional[threading.Event] = None
+
+    def obtener(self, calcular: Callable[[], dict]) -> dict:
+        while True:
+            with self._lock:
+                if self._valor is not None and time.monotonic() < self._expira:
+                    return self._valor
+                evento = self._en_curso
+                if evento is None:
+                    evento = self._en_curso = threading.Event()
+                    version = self._version
+                    break
+            # Otro request ya está calculando: esperar su resultado y volver a mirar el cache
+            evento.wait(timeout=10)
+
+        valor = None
+        try:
+            valor = calcular()
+            return valor
+        finally:
+            with self._lock:
+                # Si hubo una escritura mientras se calculaba, el resultado no se guarda
+                if valor is not None and self._version == version:
+                    self._valor, self._expira = valor, time.monotonic() + self.ttl
+                self._en_curso = None
+            evento.set()
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._valor = None
+
+
+cache = CacheEstadisticas(ttl=get_settings().stats_cache_ttl_seconds)
@@ -0,0 +1,213 @@
+"""
+Entrega de archivos estáticos y páginas HTML sin paso de build.
+
+- Cada archivo de ``static/`` se lee una sola vez y se guarda en memoria junto
+  con sus variantes gzip y brotli ya comprimidas; se responde la mejor que
+  acepte el navegador (Accept-Encoding).
+- Las páginas HTML se sirven desde memoria con sus referencias ``/static/...``
+  reescritas a URLs con huella de contenido (``pos-app.3f2a1b9c0d.js``), que
+  se cachean un año con ``Cache-Control: immutable``. Al cambiar un archivo
+  cambia su huella, así que nunca se sirve una versión vieja.
+- Las URLs sin huella siguen funcionando con ETag + ``no-cache`` (304).
+
+En modo debug se revisa la fecha de modificación en cada petición para
+recoger los cambios sin reiniciar; en producción los archivos se leen una vez.
+
+``GZipJSON`` comprime además las respuestas JSON de la API sobre un umbral.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+LARGO_HUELLA = 10
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+# Bajo este tamaño comprimir no compensa
+MINIMO_COMPRIMIR = 1024
+TIPOS_COMPRIMIBLES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+_CON_HUELLA = re.compile(rf"^(?P<base>.+)\.(?P<huella>[0-9a-f]{{{LARGO_HUELLA}}})(?P<ext>\.[^./]+)$")
+_REFERENCIA = re.compile(r'((?:src|href)=")/static/([^"?#]+)(")')
+
+
+class Activo:
+    __slots__ = ("contenido", "gzip", "br", "huella", "etag", "media_type", "mtime")
+
+    def __init__(self, contenido: bytes, media_type: str, mtime: float):
+        self.contenido = contenido
+        self.media_type = media_type
+        self.mtime = mtime
+        self.huella = hashlib.sha256(contenido).hexdigest()[:LARGO_HUELLA]
+        self.etag = f'"{self.huella}"'
+        self.gzip = self.br = None
+        if len(contenido) >= MINIMO_COMPRIMIR and media_type.startswith(TIPOS_COMPRIMIBLES):
+            self.gzip = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(contenido, quality=11)
+
+
+def _media_type(ruta: str) -> str:
+    if ruta.endswith(".js"):
+        return "application/javascript; charset=utf-8"
+    # Starlette agrega "; charset=utf-8" a los tipos text/*
+    return mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+
+
+class Activos:
+    """Archivos de ``static/`` y páginas de ``html/`` en memoria, con variantes comprimidas"""
+
+    def __init__(self, static_dir: str = "static", html_dir: str = "html", prefijo: str = "/static", recargar: bool = False):
+        self.static_dir = os.path.abspath(static_dir)
+        self.html_dir = os.path.abspath(html_dir)
+        self.prefijo = prefijo
+        self.recargar = recargar
+        self._activos = {}  # ruta absoluta -> Activo
+        self._paginas = {}  # ruta absoluta del HTML -> Activo con referencias reescritas
+
+    def _ruta_segura(self, directorio: str, relativa: str) -> Optional[str]:
+        ruta = os.path.abspath(os.path.join(directorio, relativa))
+        if not ruta.startswith(directorio + os.sep) or not os.path.isfile(ruta):
+            return None
+        return ruta
+
+    def _leer(self, ruta: str, transformar=None) -> Activo:
+        mtime = os.path.getmtime(ruta)
+        with open(ruta, "rb") as archivo:
+            contenido = archivo.read()
+        if transformar is not None:
+            contenido = transformar(contenido)
+        return Activo(contenido, _media_type(ruta), mtime)
+
+    def _obtener(self, ruta: str) -> Activo:
+        activo = self._activos.get(ruta)
+        if activo is None or (self.recargar and os.path.getmtime(ruta) != activo.mtime):
+            activo = self._activos[ruta] = self._leer(ruta)
+            if self.recargar:
+                # Las páginas guardan huellas de los archivos: se vuelven a generar
+                self._paginas.clear()
+        return activo
+
+    def url(self, relativa: str) -> str:
+        """URL con huella de contenido de un archivo de static/ (sin cambios si no existe)"""
+        ruta = self._ruta_segura(self.static_dir, relativa)
+        if ruta is None:
+            return f"{self.prefijo}/{relativa}"
+        base, ext = os.path.splitext(relativa)
+        return f"{self.prefijo}/{base}.{self._obtener(ruta).huella}{ext}"
+
+    def _reescribir(self, contenido: bytes) -> bytes:
+        texto = contenido.decode("utf-8")
+        return _REFERENCIA.sub(lambda m: m.group(1) + self.url(m.group(2)) + m.group(3), texto).encode("utf-8")
+
+    def pagina(self, nombre: str) -> Optional[Activo]:
+        """Página de html/ con sus recursos apuntando a URLs con huella"""
+        ruta = self._ruta_segura(self.html_dir, nombre)
+        if ruta is None:
+            return None
+        if self.recargar:
+            # Un cambio en cualquier recurso cambia las huellas que lleva la página
+            for activo_ruta in list(self._activos):
+                self._obtener(activo_ruta)
+        pagina = self._paginas.get(ruta)
+        if pagina is None or (self.recargar and os.path.getmtime(ruta) != pagina.mtime):
+            pagina = self._paginas[ruta] = self._leer(ruta, self._reescribir)
+        return pagina
+
+    def archivo(self, relativa: str):
+        """(Activo, inmutable) para una ruta de static/, con o sin huella"""
+        ruta = self._ruta_segura(self.static_dir, relativa)
+        if ruta is not None:
+            return self._obtener(ruta), False
+
+        coincidencia = _CON_HUELLA.match(relativa)
+        if coincidencia:
+            ruta = self._ruta_segura(self.static_dir, coincidencia["base"] + coincidencia["ext"])
+            if ruta is not None:
+                activo = self._obtener(ruta)
+                # Una huella vieja (HTML cacheado) recibe el contenido actual, pero sin cache largo
+                return activo, activo.huella == coincidencia["huella"]
+        return None, False
+
+
+def responder(request: Request, activo: Activo, inmutable: bool = False) -> Response:
+    """Respuesta con la mejor variante comprimida aceptada, ETag y cabeceras de cache"""
+    headers = {
+        "ETag": activo.etag,
+        "Cache-Control": CACHE_INMUTABLE if inmutable else CACHE_REVALIDAR,
+        "Vary": "Accept-Encoding",
+    }
+    if activo.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    aceptadas = request.headers.get("accept-encoding", "")
+    contenido = activo.contenido
+    if activo.br is not None and "br" in aceptadas:
+        contenido, headers["Content-Encoding"] = activo.br, "br"
+    elif activo.gzip is not None and "gzip" in aceptadas:
+        contenido, headers["Content-Encoding"] = activo.gzip, "gzip"
+    return Response(contenido, media_type=activo.media_type, headers=headers)
+
+
+class GZipJSON:
+    """Middleware ASGI: gzip para respuestas JSON completas sobre ``minimo`` bytes.
+
+    A diferencia de GZipMiddleware no toca respuestas en streaming (exportaciones,
+    eventos), que deben llegar al cliente apenas se generan.
+    """
+
+    def __init__(self, app, minimo: int = MINIMO_COMPRIMIR, nivel: int = 6):
+        self.app = app
+        self.minimo = minimo
+        self.nivel = nivel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        decidido = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, decidido
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body" or decidido:
+                await send(mensaje)
+                return
+
+            decidido = True
+            headers = MutableHeaders(raw=inicio["headers"])
+            cuerpo = mensaje.get("body", b"")
+            if (
+                headers.get("content-type", "").startswith("application/json")
+                and "content-encoding" not in headers
+                and not mensaje.get("more_body", False)
+                and len(cuerpo) >= self.minimo
+            ):
+                cuerpo = gzip.compress(cuerpo, compresslevel=self.nivel)
+                headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(len(cuerpo))
+                headers.add_vary_header("Accept-Encoding")
+                mensaje = {**mensaje, "body": cuerpo}
+            await send(inicio)
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,124 @@
+"""
+Eventos en vivo para las terminales (Server-Sent Events en /api/eventos).
+
+Después de cada commit los endpoints publican eventos compactos:
+
+- ``stock``: ``{"productos": [{"id", "stock"}]}`` tras ventas, retiros y ajustes;
+- ``producto``: la fila completa tras crear, editar (precio, nombre...) o dar de baja;
+- ``venta`` / ``retiro``: id, total y fecha del movimiento nuevo.
+
+Los endpoints corren en el threadpool y los suscriptores en el event loop:
+cada suscriptor tiene una cola acotada que se alimenta con
+``call_soon_threadsafe``. Si un cliente lento llena su cola se descartan sus
+eventos pendientes y recibe ``resync`` para que sincronice con
+/api/productos/changes. Al reconectar el cliente también sincroniza, así que
+un evento perdido nunca deja el stock desactualizado.
+
+El bus vive en el proceso: con varios workers cada uno publica solo sus
+propias escrituras (el despliegue actual usa uno).
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+import models
+import schemas
+import serializacion
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDIENTES = 200
+LATIDO_SEGUNDOS = 15
+REINTENTO_MS = 3000
+
+
+class Bus:
+    def __init__(self, max_pendientes: int = MAX_PENDIENTES):
+        self.max_pendientes = max_pendientes
+        self._lock = threading.Lock()
+        self._suscriptores = {}  # cola -> loop
+        self._ids = itertools.count(1)
+
+    def suscribir(self) -> asyncio.Queue:
+        cola = asyncio.Queue(maxsize=self.max_pendientes)
+        with self._lock:
+            self._suscriptores[cola] = asyncio.get_running_loop()
+        return cola
+
+    def desuscribir(self, cola: asyncio.Queue) -> None:
+        with self._lock:
+            self._suscriptores.pop(cola, None)
+
+    def hay_suscriptores(self) -> bool:
+        return bool(self._suscriptores)
+
+    def publicar(self, tipo: str, datos: dict) -> None:
+        """Enviar un evento a todos los suscriptores (se puede llamar desde cualquier hilo)"""
+        with self._lock:
+            suscriptores = list(self._suscriptores.items())
+        if not suscriptores:
+            return
+        mensaje = f"id: {next(self._ids)}\nevent: {tipo}\ndata: {serializacion.dumps(datos).decode()}\n\n"
+        for cola, loop in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, mensaje)
+            except RuntimeError:
+                # Loop cerrado (apagado del servidor)
+                self.desuscribir(cola)
+
+    def _entregar(self, cola: asyncio.Queue, mensaje: str) -> None:
+        try:
+            cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait("event: resync\ndata: {}\n\n")
+            logger.warning("⚠️ Cliente de eventos atrasado: se le pide resincronizar")
+
+
+bus = Bus()
+
+
+async def stream(request):
+    """Generador SSE de un cliente: eventos del bus más un latido para mantener viva la conexión"""
+    cola = bus.suscribir()
+    try:
+        yield f"retry: {REINTENTO_MS}\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(cola.get(), timeout=LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+    finally:
+        bus.desuscribir(cola)
+
+
+def publicar_stock(db: Session, producto_ids) -> None:
+    """Stock actual de los productos tocados por un movimiento ya confirmado"""
+    if not bus.hay_suscriptores() or not producto_ids:
+        return
+    filas = db.query(models.Producto.id, models.Producto.stock).filter(models.Producto.id.in_(producto_ids)).all()
+    bus.publicar("stock", {"productos": [{"id": producto_id, "stock": stock} for producto_id, stock in filas]})
+
+
+def publicar_productos(productos) -> None:
+    """Filas completas de productos creados o editados"""
+    if not bus.hay_suscriptores():
+        return
+    for producto in productos:
+        bus.publicar("producto", schemas.ProductoResponse.model_validate(producto).model_dump(mode="json"))
+
+
+def publicar_movimiento(tipo: str, registro) -> None:
+    """Venta o retiro nuevo (id, total, fecha y método de pago si aplica)"""
+    if not bus.hay_suscriptores():
+        return
+    datos = {"id": registro.id, "total": registro.total, "created_at": registro.created_at}
+    if tipo == "venta":
+        datos["metodo_pago"] = registro.metodo_pago
+    bus.publicar(tipo, datos)
@@ -0,0 +1,114 @@
+"""
+Exportación completa de catálogo, ventas, ítems de venta y retiros.
+
+Las filas salen directo de un cursor del servidor (``yield_per``) hacia la
+respuesta, sin construir objetos ORM ni modelos Pydantic: se serializan en
+bloques de ``FILAS_POR_BLOQUE`` como NDJSON o CSV. La memoria usada es la
+misma para un día que para dos años de ventas.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Optional, Union
+
+from sqlalchemy import select
+import models
+import lectura
+
+FILAS_POR_BLOQUE = 1000
+FORMATOS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _consulta_ventas():
+    return select(
+        models.Venta.id, models.Venta.created_at, models.Venta.metodo_pago, models.Venta.total
+    ).order_by(models.Venta.id), models.Venta.created_at
+
+
+def _consulta_venta_items():
+    return select(
+        models.VentaItem.id,
+        models.VentaItem.venta_id,
+        models.Venta.created_at,
+        models.Venta.metodo_pago,
+        models.VentaItem.producto_id,
+        models.Producto.codigo,
+        models.Producto.nombre,
+        models.VentaItem.cantidad,
+        models.VentaItem.precio_unitario,
+        models.VentaItem.subtotal,
+    ).join(models.Venta, models.VentaItem.venta_id == models.Venta.id).join(
+        models.Producto, models.VentaItem.producto_id == models.Producto.id
+    ).order_by(models.VentaItem.id), models.Venta.created_at
+
+
+def _consulta_productos():
+    return select(*models.Producto.__table__.columns).order_by(models.Producto.id), models.Producto.created_at
+
+
+def _consulta_retiros():
+    return select(
+        models.Retiro.id, models.Retiro.created_at, models.Retiro.total
+    ).order_by(models.Retiro.id), models.Retiro.created_at
+
+
+# tabla -> (consulta ordenada, columna por la que se filtra from/to)
+CONSULTAS = {
+    "ventas": _consulta_ventas,
+    "venta_items": _consulta_venta_items,
+    "productos": _consulta_productos,
+    "retiros": _consulta_retiros,
+}
+
+
+def normalizar_fecha(valor: Optional[Union[datetime, date]], fin_de_dia: bool = False) -> Optional[datetime]:
+    """Llevar from/to a datetime naive UTC (como se guarda created_at)"""
+    if valor is None:
+        return None
+    if not isinstance(valor, datetime):
+        return datetime.combine(valor + timedelta(days=1) if fin_de_dia else valor, datetime.min.time())
+    if valor.tzinfo is not None:
+        return valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor
+
+
+def _valor(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _ndjson(columnas: list, filas) -> str:
+    return "".join(
+        json.dumps(dict(zip(columnas, map(_valor, fila))), ensure_ascii=False) + "\n"
+        for fila in filas
+    )
+
+
+def _csv(filas) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[_valor(valor) for valor in fila] for fila in filas])
+    return buffer.getvalue()
+
+
+def exportar(tabla: str, formato: str, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[str]:
+    """Generador con el contenido del archivo, bloque a bloque.
+
+    Abre su propia conexión: la sesión del request ya se cerró cuando
+    StreamingResponse empieza a consumir el generador.
+    """
+    consulta, fecha = CONSULTAS[tabla]()
+    if desde is not None:
+        consulta = consulta.where(fecha >= desde)
+    if hasta is not None:
+        consulta = consulta.where(fecha < hasta)
+
+    with lectura.engine_lectura().connect() as conexion:
+        resultado = conexion.execution_options(yield_per=FILAS_POR_BLOQUE).execute(consulta)
+        columnas = list(resultado.keys())
+        if formato == "csv":
+            yield _csv([columnas])
+        for bloque in resultado.partitions():
+            yield _ndjson(columnas, bloque) if formato == "ndjson" else _csv(bloque)
@@ -0,0 +1,85 @@
+"""
+Claves de idempotencia para POST /api/ventas y POST /api/retiros.
+
+Las terminales envían un header ``Idempotency-Key`` por cada intento de
+venta/retiro. La clave se guarda en la misma transacción que el registro
+creado, así que un reintento tras un timeout devuelve el registro original
+sin volver a descontar stock.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+import models
+from config import get_settings
+
+# Probabilidad de purgar claves vencidas al registrar una nueva
+PROBABILIDAD_PURGA = 0.01
+
+
+def buscar(db: Session, clave: str, endpoint: str) -> Optional[int]:
+    """Retornar el id del recurso creado con esta clave, o None si no existe o venció"""
+    registro = db.get(models.ClaveIdempotencia, clave)
+    if registro is None:
+        return None
+
+    if registro.expira_at <= datetime.utcnow():
+        db.delete(registro)
+        db.flush()
+        return None
+
+    if registro.endpoint != endpoint:
+        raise HTTPException(
+            status_code=422,
+            detail=f"La Idempotency-Key ya fue usada en /api/{registro.endpoint}"
+        )
+
+    return registro.recurso_id
+
+
+def buscar_varias(db: Session, claves, endpoint: str) -> dict:
+    """Resolver varias claves vigentes en una sola consulta: {clave: recurso_id}
+
+    Las vencidas se eliminan (como en buscar) para que puedan volver a registrarse.
+    """
+    ahora = datetime.utcnow()
+    registros = []
+    for registro in db.query(models.ClaveIdempotencia).filter(models.ClaveIdempotencia.clave.in_(claves)):
+        if registro.expira_at <= ahora:
+            db.delete(registro)
+        else:
+            registros.append(registro)
+    db.flush()
+
+    for registro in registros:
+        if registro.endpoint != endpoint:
+            raise HTTPException(
+                status_code=422,
+                detail=f"La Idempotency-Key {registro.clave} ya fue usada en /api/{registro.endpoint}"
+            )
+
+    return {registro.clave: registro.recurso_id for registro in registros}
+
+
+def registrar(db: Session, clave: str, endpoint: str, recurso_id: int) -> None:
+    """Guardar la clave junto al recurso creado (se confirma con el commit del llamador)"""
+    ttl = timedelta(hours=get_settings().idempotency_ttl_hours)
+    db.add(models.ClaveIdempotencia(
+        clave=clave,
+        endpoint=endpoint,
+        recurso_id=recurso_id,
+        expira_at=datetime.utcnow() + ttl
+    ))
+
+    if random.random() < PROBABILIDAD_PURGA:
+        purgar_expiradas(db)
+
+
+def purgar_expiradas(db: Session) -> int:
+    """Eliminar las claves vencidas (usa el índice sobre expira_at)"""
+    return db.query(models.ClaveIdempotencia).filter(
+        models.ClaveIdempotencia.expira_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
@@ -0,0 +1,344 @@
+"""
+Movimientos de inventario compartidos por ventas y retiros.
+
+Resuelve todas las líneas de un movimiento en una sola consulta y descuenta
+el stock con un único UPDATE condicional, de modo que dos terminales no
+puedan vender (o retirar) la misma última unidad.
+
+Cada movimiento también se agrega al ledger ``stock_movements``. El ledger
+se compacta periódicamente en ``stock_snapshots`` (ver compactar_stock.py)
+y permite consultar el stock en cualquier fecha como snapshot + cola, sin
+recorrer venta_items ni retiro_items.
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session
+import models
+import busqueda
+import catalogo
+import database
+
+logger = logging.getLogger(__name__)
+
+def agrupar_cantidades(items) -> dict:
+    """Sumar las cantidades por producto (un producto puede venir en varias líneas)"""
+    cantidades = {}
+    for item in items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+    return cantidades
+
+
+def obtener_productos(db: Session, producto_ids, bloquear: bool = False) -> dict:
+    """Cargar los productos indicados en una sola consulta, indexados por id.
+
+    Con ``bloquear`` las filas quedan bloqueadas hasta el commit (FOR UPDATE;
+    en SQLite el lock de escritura): el stock leído no cambia por debajo.
+    """
+    query = db.query(models.Producto).filter(models.Producto.id.in_(producto_ids))
+    if bloquear:
+        database.tomar_escritura(db)
+        query = query.with_for_update()
+    return {producto.id: producto for producto in query.all()}
+
+
+def resolver_en_indice(items) -> None:
+    """Completar producto_id de las líneas con código de barras usando el índice en memoria.
+
+    Toma el lock del índice: las rutas async lo llaman en el threadpool antes
+    de entrar a la sesión (ver asincrono.ruta_async).
+    """
+    for item in items:
+        if item.producto_id is None:
+            producto = busqueda.indice.por_codigo(item.codigo)
+            if producto is not None:
+                item.producto_id = producto["id"]
+
+
+def resolver_codigos(db: Session, items) -> list:
+    """Completar producto_id de las líneas que vienen con código de barras.
+
+    Los códigos que resolver_en_indice no encontró (p. ej. productos recién
+    creados en otro proceso) se buscan en la base, todos en una consulta.
+    Retorna los códigos no encontrados.
+    """
+    pendientes = [item for item in items if item.producto_id is None]
+    if pendientes:
+        por_codigo = dict(db.query(models.Producto.codigo, models.Producto.id).filter(
+            models.Producto.codigo.in_({item.codigo for item in pendientes}),
+            models.Producto.activo == True
+        ).all())
+        for item in pendientes:
+            item.producto_id = por_codigo.get(item.codigo)
+
+    return [item.codigo for item in items if item.producto_id is None]
+
+
+def completar_precios(items, productos: dict) -> None:
+    """Usar el precio de venta actual en las líneas que no traen precio_unitario"""
+    for item in items:
+        if item.precio_unitario is None:
+            item.precio_unitario = productos[item.producto_id].precio_venta
+
+
+def cargar_productos(db: Session, cantidades: dict) -> dict:
+    """Cargar todos los productos del movimiento en una sola consulta y validar stock"""
+    productos = obtener_productos(db, cantidades)
+
+    for producto_id, cantidad in cantidades.items():
+        producto = productos.get(producto_id)
+        if not producto:
+            raise HTTPException(status_code=404, detail=f"Producto {producto_id} no encontrado")
+
+        if (producto.stock or 0) < cantidad:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock or 0}"
+            )
+
+    return productos
+
+
+def descontar_stock(db: Session, cantidades: dict) -> None:
+    """Descontar stock en un solo UPDATE condicional (ver sumar_stock)"""
+    sumar_stock(db, {producto_id: -cantidad for producto_id, cantidad in cantidades.items()})
+
+
+def sumar_stock(db: Session, deltas: dict) -> None:
+    """Aplicar incrementos/decrementos de stock en un solo UPDATE condicional.
+
+    Si algún producto quedaría en negativo (otra terminal vendió entretanto)
+    el UPDATE afecta menos filas: se hace rollback y se responde 409 con el
+    detalle de cada línea en conflicto.
+    """
+    if not deltas:
+        # Venta o retiro sin líneas: nada que descontar (case() no acepta un mapa vacío)
+        return
+    delta = case(deltas, value=models.Producto.id)
+    resultado = db.execute(
+        update(models.Producto)
+        .where(models.Producto.id.in_(deltas), models.Producto.stock + delta >= 0)
+        .values(stock=models.Producto.stock + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+    if resultado.rowcount != len(deltas):
+        db.rollback()
+        raise HTTPException(status_code=409, detail=detalle_conflicto_stock(db, deltas))
+
+
+def detalle_conflicto_stock(db: Session, deltas: dict) -> str:
+    """Describir, línea por línea, los productos sin stock suficiente"""
+    productos = db.query(
+        models.Producto.id, models.Producto.nombre, models.Producto.stock
+    ).filter(models.Producto.id.in_(deltas)).all()
+
+    conflictos = [
+        f"Stock insuficiente para {nombre}. Disponible: {stock or 0}, solicitado: {-deltas[producto_id]}"
+        for producto_id, nombre, stock in productos
+        if (stock or 0) + deltas[producto_id] < 0
+    ]
+    return "; ".join(conflictos) or "Conflicto de stock, intente nuevamente"
+
+
+# ============== LEDGER DE STOCK ==============
+
+def salidas(tipo: str, cantidades: dict, referencia_id: Optional[int] = None) -> list:
+    """Filas de ledger para productos que salen del inventario (venta o retiro)"""
+    return [
+        {"producto_id": producto_id, "tipo": tipo, "cantidad": -cantidad, "referencia_id": referencia_id}
+        for producto_id, cantidad in cantidades.items()
+    ]
+
+
+def registrar_movimientos(db: Session, movimientos: list) -> None:
+    """Agregar movimientos al ledger con un solo INSERT multi-fila.
+
+    Llevan la marca provisoria del catálogo (el llamador publica después del
+    commit, ver catalogo.publicar). Antes de insertar se toma el lock
+    compartido de la barrera de compactación: las transacciones con
+    movimientos no se bloquean entre sí, pero compactar_stock puede esperar a
+    que terminen las que están en curso.
+    """
+    if movimientos:
+        _barrera_compartida(db)
+        marca = catalogo.marca(db)
+        db.execute(insert(models.MovimientoStock), [dict(fila, version=marca) for fila in movimientos])
+
+
+def _barrera_compartida(db: Session) -> None:
+    """Lock compartido (MySQL) sobre la fila de compactación, una vez por transacción"""
+    transaccion = db.get_transaction()
+    if db.info.get("barrera_compactacion") is transaccion:
+        return
+    db.execute(
+        select(models.VersionCatalogo.id)
+        .where(models.VersionCatalogo.id == catalogo.FILA_COMPACTACION)
+        .with_for_update(read=True)
+    )
+    db.info["barrera_compactacion"] = transaccion
+
+
+def _ultimos_snapshots(db: Session, momento: Optional[datetime] = None):
+    """Subconsulta con el último snapshot de cada producto (opcionalmente hasta un momento)"""
+    ultimo = db.query(
+        models.SnapshotStock.producto_id,
+        func.max(models.SnapshotStock.id).label("id")
+    )
+    if momento is not None:
+        ultimo = ultimo.filter(models.SnapshotStock.created_at <= momento)
+    ultimo = ultimo.group_by(models.SnapshotStock.producto_id).subquery()
+
+    return db.query(
+        models.SnapshotStock.producto_id,
+        models.SnapshotStock.stock,
+        models.SnapshotStock.movimiento_id
+    ).join(ultimo, models.SnapshotStock.id == ultimo.c.id).subquery()
+
+
+def _cola(db: Session, snapshots, momento: Optional[datetime] = None, hasta_id: Optional[int] = None) -> dict:
+    """Sumar por producto los movimientos posteriores a su snapshot (solo productos con snapshot)"""
+    query = db.query(
+        models.MovimientoStock.producto_id,
+        func.sum(models.MovimientoStock.cantidad)
+    ).join(
+        snapshots, snapshots.c.producto_id == models.MovimientoStock.producto_id
+    ).filter(
+        models.MovimientoStock.id > snapshots.c.movimiento_id
+    )
+    if momento is not None:
+        query = query.filter(models.MovimientoStock.created_at <= momento)
+    if hasta_id is not None:
+        query = query.filter(models.MovimientoStock.id <= hasta_id)
+    return {producto_id: int(total or 0) for producto_id, total in query.group_by(models.MovimientoStock.producto_id)}
+
+
+def _lineas_base(db: Session) -> dict:
+    """Stock previo al ledger de los productos que aún no tienen snapshot.
+    
+    Es el stock materializado menos todo lo registrado en el ledger, de modo
+    que los productos existentes antes del ledger no parten desde cero. Una
+    sola consulta: stock y ledger se leen del mismo estado aunque haya ventas
+    confirmándose. Solo lo usa compactar_stock, la primera vez que ve cada
+    producto. Retorna {producto_id: (stock, created_at)}.
+    """
+    registrado = select(func.coalesce(func.sum(models.MovimientoStock.cantidad), 0)).where(
+        models.MovimientoStock.producto_id == models.Producto.id
+    ).scalar_subquery()
+    productos = db.query(
+        models.Producto.id, models.Producto.stock, registrado, models.Producto.created_at
+    ).filter(~models.Producto.id.in_(select(models.SnapshotStock.producto_id)))
+
+    return {
+        producto_id: ((stock or 0) - int(total or 0), created_at)
+        for producto_id, stock, total, created_at in productos
+    }
+
+
+def stock_en(db: Session, momento: datetime, producto_ids=None) -> dict:
+    """Stock de cada producto en un momento dado.
+
+    Con snapshot anterior al momento: último snapshot + cola del ledger hasta
+    el momento. Sin él (producto aún no compactado): stock actual menos lo
+    movido después del momento. Ninguno de los dos recorre el ledger completo.
+    """
+    snapshots = _ultimos_snapshots(db, momento)
+    base = {
+        producto_id: stock
+        for producto_id, stock, _ in db.query(snapshots.c.producto_id, snapshots.c.stock, snapshots.c.movimiento_id)
+    }
+    cola = _cola(db, snapshots, momento=momento)
+
+    sin_snapshot = ~models.MovimientoStock.producto_id.in_(select(snapshots.c.producto_id))
+    posteriores = dict(db.query(
+        models.MovimientoStock.producto_id,
+        func.sum(models.MovimientoStock.cantidad)
+    ).filter(
+        models.MovimientoStock.created_at > momento, sin_snapshot
+    ).group_by(models.MovimientoStock.producto_id).all())
+
+    productos = db.query(models.Producto.id, models.Producto.stock, models.Producto.created_at)
+    if producto_ids:
+        productos = productos.filter(models.Producto.id.in_(producto_ids))
+
+    resultado = {}
+    for producto_id, stock, created_at in productos:
+        if producto_id in base:
+            resultado[producto_id] = base[producto_id] + cola.get(producto_id, 0)
+        elif created_at is not None and created_at > momento:
+            resultado[producto_id] = 0
+        else:
+            resultado[producto_id] = (stock or 0) - int(posteriores.get(producto_id) or 0)
+    return resultado
+
+
+def compactar_stock(db: Session) -> dict:
+    """Plegar la cola del ledger en un nuevo snapshot por producto.
+    
+    También compara el resultado con productos.stock (la materialización que
+    se mantiene en cada venta/retiro) y registra cualquier diferencia.
+
+    Solo la lectura del límite se coordina con las escrituras: con el lock
+    exclusivo de la barrera de compactación, cuyo lock compartido toma toda
+    transacción que agrega movimientos (ver registrar_movimientos), ya no hay
+    movimientos sin confirmar, así que ninguno con id <= hasta_id puede
+    aparecer después. Ese lock se suelta de inmediato; el plegado y la
+    comparación corren sin bloquear ventas, retiros ni reposiciones, y la
+    comparación descuenta del stock lo movido después del límite.
+    """
+    catalogo.publicar_pendientes(db)
+
+    catalogo.incrementar(db, catalogo.FILA_COMPACTACION)
+    hasta_id = db.query(func.max(models.MovimientoStock.id)).scalar() or 0
+    db.commit()
+
+    # Línea base para los productos que nunca se han compactado
+    lineas_base = _lineas_base(db)
+    if lineas_base:
+        db.execute(insert(models.SnapshotStock), [
+            {"producto_id": producto_id, "stock": stock, "movimiento_id": 0,
+             "created_at": created_at or datetime.utcnow()}
+            for producto_id, (stock, created_at) in lineas_base.items()
+        ])
+        db.commit()
+
+    snapshots = _ultimos_snapshots(db)
+    actuales = {
+        producto_id: stock
+        for producto_id, stock, _ in db.query(snapshots.c.producto_id, snapshots.c.stock, snapshots.c.movimiento_id)
+    }
+    cola = _cola(db, snapshots, hasta_id=hasta_id)
+
+    nuevos = [
+        {"producto_id": producto_id, "stock": actuales.get(producto_id, 0) + delta, "movimiento_id": hasta_id}
+        for producto_id, delta in cola.items()
+    ]
+    if nuevos:
+        db.execute(insert(models.SnapshotStock), nuevos)
+        db.commit()
+        for fila in nuevos:
+            actuales[fila["producto_id"]] = fila["stock"]
+
+    # Stock al límite = stock actual menos lo movido después (en una sola consulta, mismo estado)
+    posteriores = select(func.coalesce(func.sum(models.MovimientoStock.cantidad), 0)).where(
+        models.MovimientoStock.producto_id == models.Producto.id, models.MovimientoStock.id > hasta_id
+    ).scalar_subquery()
+    diferencias = [
+        {"producto_id": producto_id, "ledger": actuales.get(producto_id), "stock": (stock or 0) - int(despues or 0)}
+        for producto_id, stock, despues in db.query(models.Producto.id, models.Producto.stock, posteriores)
+        if producto_id in actuales and actuales[producto_id] != (stock or 0) - int(despues or 0)
+    ]
+    for diferencia in diferencias:
+        logger.warning(f"⚠️ Stock descuadrado: {diferencia}")
+
+    db.commit()
+    return {
+        "lineas_base": len(lineas_base),
+        "snapshots": len(nuevos),
+        "movimiento_id": hasta_id,
+        "diferencias": diferencias
+    }
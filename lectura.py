@@ -0,0 +1,146 @@
+"""
+Engine de solo lectura para consultas pesadas (historial, estadísticas,
+reportes y exportaciones).
+
+Las rutas que leen mucho y toleran unos segundos de atraso usan
+``get_db_lectura`` (o ``get_sesion_lectura`` en rutas async) en vez de la
+sesión normal, así un reporte largo no compite con las ventas:
+
+- Con ``READ_DATABASE_URL`` se lee de esa base (réplica MySQL).
+- En SQLite, con ``SQLITE_SNAPSHOT_SECONDS`` > 0, un hilo copia la base con
+  la API de backup de sqlite3 a un archivo aparte cada N segundos y las
+  lecturas se hacen sobre esa copia en modo solo lectura.
+- Sin ninguna de las dos se usa la base principal, como antes.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import get_settings
+from database import engine, SessionLocal, database_url, es_sqlite, get_sesion, normalizar_url
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+usa_snapshot = (
+    not settings.read_database_url
+    and es_sqlite
+    and settings.sqlite_snapshot_seconds > 0
+    and ":memory:" not in database_url
+)
+ruta_snapshot = None
+read_engine = None
+
+if settings.read_database_url:
+    read_engine = create_engine(
+        normalizar_url(settings.read_database_url),
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=settings.debug,
+    )
+    logger.info("📖 Lecturas pesadas desde READ_DATABASE_URL")
+elif usa_snapshot:
+    ruta_snapshot = os.path.abspath(settings.sqlite_snapshot_path or f"{engine.url.database}.snapshot")
+    read_engine = create_engine(
+        f"sqlite:///file:{ruta_snapshot}?mode=ro&uri=true",
+        pool_size=settings.sqlite_pool_size,
+        max_overflow=0,
+        echo=settings.debug,
+        connect_args={"check_same_thread": False},
+    )
+    logger.info(f"📖 Lecturas pesadas desde snapshot cada {settings.sqlite_snapshot_seconds}s: {ruta_snapshot}")
+
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else None
+
+
+def disponible() -> bool:
+    """Hay engine de lectura y, si es snapshot, ya se tomó el primero"""
+    return read_engine is not None and (ruta_snapshot is None or os.path.exists(ruta_snapshot))
+
+
+def engine_lectura():
+    return read_engine if disponible() else engine
+
+
+def get_db_lectura():
+    """Sesión (síncrona) de lectura; la principal si no hay réplica ni snapshot"""
+    db = SessionLectura() if disponible() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_sesion_lectura():
+    """Para rutas async: sin réplica ni snapshot se mantiene la AsyncSession principal"""
+    if disponible():
+        db = SessionLectura()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+    async for db in get_sesion():
+        yield db
+
+
+# ============== SNAPSHOT SQLITE ==============
+
+def tomar_snapshot() -> None:
+    """Copiar la base a ruta_snapshot con la API de backup y reemplazar la copia anterior.
+
+    La copia se hace en un archivo temporal y se mueve con os.replace: las
+    consultas en curso terminan sobre el archivo anterior y las conexiones
+    nuevas abren el nuevo. El temporal lleva el pid: con varios workers cada
+    uno copia en su propio archivo y el último os.replace gana.
+    """
+    inicio = time.perf_counter()
+    temporal = f"{ruta_snapshot}.{os.getpid()}.tmp"
+    try:
+        origen = sqlite3.connect(engine.url.database, timeout=settings.sqlite_busy_timeout_ms / 1000)
+        try:
+            destino = sqlite3.connect(temporal)
+            try:
+                # Un solo paso: copia consistente; en WAL no bloquea a los escritores
+                origen.backup(destino)
+                # Sin WAL la copia se puede abrir en solo lectura sin archivos -wal/-shm
+                destino.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                destino.close()
+        finally:
+            origen.close()
+        os.replace(temporal, ruta_snapshot)
+    except Exception:
+        # No dejar temporales por worker si la copia falla
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    read_engine.dispose()
+    logger.info(f"📸 Snapshot de lectura actualizado en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+
+_hilo = None
+
+
+def iniciar_snapshots() -> None:
+    """Tomar el primer snapshot y renovarlo periódicamente en segundo plano"""
+    global _hilo
+    if not usa_snapshot or _hilo is not None:
+        return
+
+    def renovar():
+        while True:
+            try:
+                tomar_snapshot()
+            except Exception as e:
+                logger.error(f"❌ Error tomando snapshot de lectura: {e}")
+            time.sleep(settings.sqlite_snapshot_seconds)
+
+    _hilo = threading.Thread(target=renovar, name="snapshot-lectura", daemon=True)
+    _hilo.start()
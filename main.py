@@ -1,11 +1,29 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, raiseload, selectinload
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
+from datetime import date, datetime, timedelta, timezone
 import models
 import schemas
-from database import engine, get_db
+import inventario
+import idempotencia
+import catalogo
+import busqueda
+import paginacion
+import exportar
+import serializacion
+import estaticos
+import resumen
+import reportes
+import estadisticas
+import eventos
+import asincrono
+import lectura
+import migraciones
+from database import engine, get_db, SessionLocal
 from config import get_settings
 import logging
 import sys
@@ -26,66 +44,58 @@ logger.info(f"Python version: {sys.version}")
 logger.info(f"Working directory: {os.getcwd()}")
 logger.info(f"PORT env var: {os.getenv('PORT', 'NOT_SET')}")
 
-# Crear tablas de forma más robusta
-try:
-    logger.info("Intentando crear tablas de base de datos...")
-    models.Base.metadata.create_all(bind=engine)
-    logger.info("✅ Database tables created successfully")
-    
-    # Inicializar datos básicos en producción
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        logger.info("Verificando si existen productos en la BD...")
-        # Verificar si hay productos
-        producto_count = db.query(models.Producto).count()
-        logger.info(f"Productos encontrados: {producto_count}")
-        
-        if producto_count == 0:
-            logger.info("No products found, creating sample data...")
-            # Crear algunos productos básicos
-            productos_basicos = [
-                {"codigo": "PISCO001", "nombre": "Pisco Alto del Carmen 35°", "precio_compra": 5500, "precio_venta": 6990, "stock": 12, "categoria": "Licores", "marca": "Alto del Carmen", "litros": 1.0},
-                {"codigo": "VODKA001", "nombre": "Vodka Absolut", "precio_compra": 11990, "precio_venta": 14990, "stock": 8, "categoria": "Licores", "marca": "Absolut", "litros": 1.0},
-                {"codigo": "RON001", "nombre": "Ron Bacardi Blanco", "precio_compra": 6990, "precio_venta": 8990, "stock": 10, "categoria": "Licores", "marca": "Bacardi", "litros": 1.0}
-            ]
-            
-            for producto_data in productos_basicos:
-                producto = models.Producto(**producto_data)
-                db.add(producto)
-            
-            db.commit()
-            logger.info("✅ Sample data created successfully")
-        else:
-            logger.info("✅ Products already exist in database")
-    except Exception as init_error:
-        logger.error(f"❌ Error initializing data: {init_error}")
-        logger.exception("Full stacktrace:")
-        db.rollback()
-    finally:
-        db.close()
-        
-except Exception as e:
-    logger.error(f"❌ Error creating database tables: {e}")
-    logger.exception("Full stacktrace:")
-    # Continuar con la aplicación incluso si hay problemas con las tablas
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque de cada worker: solo migraciones pendientes; índice y snapshots en segundo plano.
+
+    Importar main.py ya no toca la base; los productos de ejemplo se cargan
+    con ``python sembrar.py``.
+    """
+    if settings.migrar_al_iniciar:
+        try:
+            versiones = await run_in_threadpool(migraciones.migrar, engine)
+            if versiones:
+                logger.info(f"✅ Migraciones aplicadas: {versiones}")
+        except Exception as e:
+            # Continuar con la aplicación incluso si hay problemas con las tablas
+            logger.error(f"❌ Error aplicando migraciones: {e}")
+            logger.exception("Full stacktrace:")
+    busqueda.indice.iniciar(SessionLocal)
+    lectura.iniciar_snapshots()
+    yield
+
 
 # Inicializar FastAPI
 logger.info("Inicializando FastAPI...")
-settings = get_settings()
-app = FastAPI(title=settings.app_name)
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
 logger.info(f"✅ FastAPI initialized with title: {settings.app_name}")
 
-# Montar archivos estáticos
-logger.info("Montando archivos estáticos...")
-try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-    app.mount("/html", StaticFiles(directory="html"), name="html")
-    logger.info("✅ Static files mounted successfully")
-except Exception as static_error:
-    logger.error(f"❌ Error mounting static files: {static_error}")
-    logger.exception("Full stacktrace:")
+# Archivos estáticos y páginas en memoria, precomprimidos y con huella de contenido
+logger.info("Configurando archivos estáticos...")
+activos = estaticos.Activos(static_dir="static", html_dir="html", prefijo="/static", recargar=settings.debug)
+app.add_middleware(estaticos.GZipJSON, minimo=1024)
+
+@app.get("/static/{ruta:path}", include_in_schema=False)
+def archivo_estatico(ruta: str, request: Request):
+    """Servir un archivo de static/ (con o sin huella en el nombre)"""
+    activo, inmutable = activos.archivo(ruta)
+    if activo is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    return estaticos.responder(request, activo, inmutable)
+
+@app.get("/html/{nombre:path}", include_in_schema=False)
+def archivo_html(nombre: str, request: Request):
+    """Servir una página de html/ desde memoria"""
+    return servir_pagina(nombre, request)
+
+def servir_pagina(nombre: str, request: Request):
+    pagina = activos.pagina(nombre)
+    if pagina is None:
+        raise HTTPException(status_code=404, detail="Página no encontrada")
+    return estaticos.responder(request, pagina)
 
 logger.info("=== CONFIGURANDO ENDPOINTS ===")
 
@@ -119,46 +129,43 @@ def health_check():
         return {"status": "unhealthy", "error": str(e)}
 
 @app.get("/")
-def root():
+def root(request: Request):
     """Servir la página principal"""
     logger.info("Root endpoint called")
-    try:
-        return FileResponse("html/index.html")
-    except Exception as e:
-        logger.error(f"❌ Error serving index.html: {e}")
-        logger.exception("Root endpoint exception:")
-        raise HTTPException(status_code=500, detail=f"Error serving page: {e}")
+    return servir_pagina("index.html", request)
 
 @app.get("/pos.html")
-def pos_page():
+def pos_page(request: Request):
     """Servir página POS"""
-    return FileResponse("html/pos.html")
+    return servir_pagina("pos.html", request)
 
 @app.get("/productos.html")
-def productos_page():
+def productos_page(request: Request):
     """Servir página de productos"""
-    return FileResponse("html/productos.html")
+    return servir_pagina("productos.html", request)
 
 @app.get("/ventas.html")
-def ventas_page():
+def ventas_page(request: Request):
     """Servir página de ventas"""
-    return FileResponse("html/ventas.html")
+    return servir_pagina("ventas.html", request)
 
 @app.get("/retiros.html")
-def retiros_page():
+def retiros_page(request: Request):
     """Servir página de retiros"""
-    return FileResponse("html/retiros.html")
+    return servir_pagina("retiros.html", request)
 
 @app.get("/favicon.ico")
-def favicon():
+def favicon(request: Request):
     """Servir favicon"""
-    return FileResponse("static/favicon.svg")
+    activo, _ = activos.archivo("favicon.svg")
+    return estaticos.responder(request, activo)
 
 logger.info("✅ Main endpoints configured")
 
 # ============== RUTAS DE PRODUCTOS ==============
 
 @app.post("/api/productos", response_model=schemas.ProductoResponse, status_code=201)
+@asincrono.ruta_async(schemas.ProductoResponse)
 def crear_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_db)):
     """Crear un nuevo producto"""
     # Verificar si el código ya existe
@@ -168,52 +175,188 @@ def crear_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_d
     
     nuevo_producto = models.Producto(**producto.model_dump())
     db.add(nuevo_producto)
+    db.flush()
+    
+    if nuevo_producto.stock:
+        inventario.registrar_movimientos(db, [
+            {"producto_id": nuevo_producto.id, "tipo": "ajuste", "cantidad": nuevo_producto.stock}
+        ])
+    catalogo.registrar_cambio(db, nuevo_producto.id)
+    
     db.commit()
+    catalogo.publicar(db)
+    busqueda.indice.invalidar()
+    estadisticas.cache.invalidar()
     db.refresh(nuevo_producto)
+    eventos.publicar_productos([nuevo_producto])
     return nuevo_producto
 
 @app.get("/api/productos", response_model=List[schemas.ProductoResponse])
+@asincrono.ruta_async(List[schemas.ProductoResponse])
 def listar_productos(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Valor del header X-Next-Cursor de la página anterior"),
+    limit: int = Query(100, ge=1, le=settings.max_page_productos),
     activo: Optional[bool] = None,
     categoria: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Columnas a devolver, p. ej. id,codigo,nombre,precio_venta,stock"),
     db: Session = Depends(get_db)
 ):
-    """Listar todos los productos"""
-    query = db.query(models.Producto)
+    """Listar productos por páginas (cursor en X-Next-Cursor)"""
+    # GET condicional: si el catálogo no cambió, 304 sin consultar productos
+    etag = catalogo.etag(db, request.url.query)
+    if catalogo.coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        # Cursor leído antes que los datos: sirve de punto de partida para /api/productos/changes
+        "X-Catalogo-Cursor": catalogo.codificar_cursor(catalogo.cursor_actual(db)),
+    }
+    
+    # Solo las columnas pedidas, como tuplas: sin objetos ORM ni validación Pydantic
+    columnas = serializacion.columnas(models.Producto, schemas.ProductoResponse, fields)
+    query = db.query(*columnas)
     
     if activo is not None:
         query = query.filter(models.Producto.activo == activo)
     if categoria:
         query = query.filter(models.Producto.categoria == categoria)
     
-    productos = query.offset(skip).limit(limit).all()
-    return productos
+    productos, siguiente = paginacion.por_id(query, models.Producto, cursor, limit)
+    if siguiente:
+        headers[paginacion.HEADER_SIGUIENTE] = siguiente
+    return serializacion.RespuestaJSON(serializacion.filas(columnas, productos), headers=headers)
+
+@app.get("/api/productos/changes", response_model=schemas.ProductosCambios)
+@asincrono.ruta_async(schemas.ProductosCambios)
+def cambios_productos(
+    since: Optional[str] = Query(None, description="Cursor devuelto por la sincronización anterior"),
+    db: Session = Depends(get_db)
+):
+    """Productos creados, modificados o dados de baja desde el cursor (sin cursor: todo el catálogo)"""
+    # El cursor nuevo se lee antes que los productos y las versiones se publican en
+    # orden (ver catalogo.py): un cambio concurrente se entregará (de nuevo) en la
+    # próxima sincronización, nunca se salta.
+    hasta = catalogo.cursor_actual(db)
+    query = db.query(models.Producto)
+    
+    desde = catalogo.decodificar_cursor(since) if since else None
+    if desde is not None:
+        ids = catalogo.productos_cambiados(db, desde, hasta)
+        query = query.filter(models.Producto.id.in_(ids)) if ids else None
+    
+    return {
+        "cursor": catalogo.codificar_cursor(hasta),
+        "productos": query.all() if query is not None else []
+    }
 
 @app.get("/api/productos/buscar", response_model=List[schemas.ProductoSearch])
 def buscar_productos(
     q: str = Query(..., min_length=1, description="Término de búsqueda"),
     db: Session = Depends(get_db)
 ):
-    """Buscar productos por código o nombre"""
-    search_term = f"%{q}%"
-    productos = db.query(models.Producto).filter(
-        (models.Producto.codigo.like(search_term)) |
-        (models.Producto.nombre.like(search_term))
-    ).filter(models.Producto.activo == True).limit(20).all()
-    
-    return productos
+    """Buscar productos por código, nombre, marca o categoría (sin acentos ni mayúsculas)"""
+    busqueda.indice.sincronizar(db)
+    return busqueda.indice.buscar(q, limite=20)
+
+@app.post("/api/productos/stock", response_model=List[schemas.ProductoResponse])
+@asincrono.ruta_async(List[schemas.ProductoResponse])
+def ajustar_stock(ajuste: schemas.AjusteStockCreate, db: Session = Depends(get_db)):
+    """Sumar/restar stock a varios productos en una transacción (p. ej. recepción de proveedor)"""
+    try:
+        ids = {item.producto_id for item in ajuste.items if item.producto_id is not None}
+        codigos = {item.codigo for item in ajuste.items if item.codigo is not None}
+        
+        # Resolver ids y códigos en una sola consulta
+        productos = db.query(models.Producto.id, models.Producto.codigo).filter(
+            models.Producto.id.in_(ids) | models.Producto.codigo.in_(codigos)
+        ).all()
+        por_codigo = {codigo: producto_id for producto_id, codigo in productos}
+        encontrados = {producto_id for producto_id, _ in productos}
+        
+        faltantes = [str(i) for i in ids - encontrados] + [c for c in codigos if c not in por_codigo]
+        if faltantes:
+            raise HTTPException(status_code=404, detail=f"Productos no encontrados: {', '.join(faltantes)}")
+        
+        deltas = {}
+        for item in ajuste.items:
+            producto_id = item.producto_id if item.producto_id is not None else por_codigo[item.codigo]
+            deltas[producto_id] = deltas.get(producto_id, 0) + item.delta
+        deltas = {producto_id: delta for producto_id, delta in deltas.items() if delta != 0}
+        
+        if deltas:
+            inventario.registrar_movimientos(db, [
+                {"producto_id": producto_id, "tipo": ajuste.tipo, "cantidad": delta}
+                for producto_id, delta in deltas.items()
+            ])
+            # Incremento en el servidor: no se pisan ventas concurrentes
+            inventario.sumar_stock(db, deltas)
+            db.commit()
+            catalogo.publicar(db)
+            busqueda.indice.invalidar()
+            estadisticas.cache.invalidar()
+        
+        # Solo las filas modificadas
+        actualizados = db.query(models.Producto).filter(models.Producto.id.in_(deltas)).all()
+        if actualizados:
+            eventos.bus.publicar("stock", {"productos": [{"id": p.id, "stock": p.stock} for p in actualizados]})
+        return actualizados
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/productos/sugerir", response_model=List[schemas.ProductoSearch])
+def sugerir_productos(
+    q: str = Query(..., min_length=1, description="Texto tipeado en el buscador del POS"),
+    limite: int = Query(8, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Autocompletado tolerante a errores de tipeo (responde desde memoria)"""
+    busqueda.indice.sincronizar(db)
+    return busqueda.indice.sugerir(q, limite=limite)
+
+@app.get("/api/productos/codigo/{codigo}", response_model=schemas.ProductoSearch)
+def producto_por_codigo(codigo: str, db: Session = Depends(get_db)):
+    """Lectura de código de barras en caja: id, precio y stock desde memoria"""
+    busqueda.indice.sincronizar(db)
+    producto = busqueda.indice.por_codigo(codigo)
+    if producto is None:
+        # Puede haberse creado recién en otro proceso: una sola consulta de respaldo
+        producto = db.query(models.Producto).filter(
+            models.Producto.codigo == codigo,
+            models.Producto.activo == True
+        ).first()
+    if producto is None:
+        raise HTTPException(status_code=404, detail=f"Código {codigo} no encontrado")
+    return producto
 
 @app.get("/api/productos/{producto_id}", response_model=schemas.ProductoResponse)
-def obtener_producto(producto_id: int, db: Session = Depends(get_db)):
+@asincrono.ruta_async(schemas.ProductoResponse)
+def obtener_producto(
+    producto_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
     """Obtener un producto por ID"""
+    etag = catalogo.etag(db, producto_id)
+    if catalogo.coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    
     producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return producto
 
 @app.put("/api/productos/{producto_id}", response_model=schemas.ProductoResponse)
+@asincrono.ruta_async(schemas.ProductoResponse)
 def actualizar_producto(
     producto_id: int,
     producto: schemas.ProductoUpdate,
@@ -226,14 +369,27 @@ def actualizar_producto(
     
     # Actualizar solo los campos proporcionados
     update_data = producto.model_dump(exclude_unset=True)
+    
+    # Un cambio manual de stock queda en el ledger como ajuste
+    if update_data.get("stock") is not None and update_data["stock"] != (db_producto.stock or 0):
+        inventario.registrar_movimientos(db, [
+            {"producto_id": db_producto.id, "tipo": "ajuste", "cantidad": update_data["stock"] - (db_producto.stock or 0)}
+        ])
+    
     for key, value in update_data.items():
         setattr(db_producto, key, value)
+    catalogo.registrar_cambio(db, db_producto.id)
     
     db.commit()
+    catalogo.publicar(db)
+    busqueda.indice.invalidar()
+    estadisticas.cache.invalidar()
     db.refresh(db_producto)
+    eventos.publicar_productos([db_producto])
     return db_producto
 
 @app.delete("/api/productos/{producto_id}", status_code=204)
+@asincrono.ruta_async()
 def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
     """Eliminar un producto (soft delete)"""
     db_producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
@@ -241,34 +397,70 @@ def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
     db_producto.activo = False
+    catalogo.registrar_cambio(db, db_producto.id)
     db.commit()
+    catalogo.publicar(db)
+    busqueda.indice.invalidar()
+    estadisticas.cache.invalidar()
+    eventos.publicar_productos([db_producto])
     return None
 
 # ============== RUTAS DE VENTAS ==============
 
+def cargar_venta(db: Session, venta_id: int):
+    """Venta con sus líneas y el nombre de cada producto en dos consultas fijas.
+
+    raiseload evita que una relación no prevista agregue consultas por línea
+    al serializar.
+    """
+    return db.query(models.Venta).options(
+        selectinload(models.Venta.items).joinedload(models.VentaItem.producto).load_only(models.Producto.nombre),
+        raiseload("*")
+    ).populate_existing().filter(models.Venta.id == venta_id).first()
+
+def codigos_venta(venta: schemas.VentaCreate, **_) -> None:
+    """Resolver los códigos escaneados con el índice en memoria (en el threadpool)"""
+    inventario.resolver_en_indice(venta.items)
+
+def codigos_lote(lote: schemas.VentaBatchCreate, **_) -> None:
+    """Lo mismo para todas las líneas de un lote"""
+    inventario.resolver_en_indice([item for v in lote.ventas for item in v.items])
+
 @app.post("/api/ventas", response_model=schemas.VentaResponse, status_code=201)
-def crear_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
+@asincrono.ruta_async(schemas.VentaResponse, preparar=codigos_venta)
+def crear_venta(
+    venta: schemas.VentaCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=100),
+    db: Session = Depends(get_db)
+):
     """Crear una nueva venta y actualizar inventario"""
     try:
-        # Validar stock y calcular total
+        # Reintento de una terminal: devolver la venta original sin tocar inventario
+        if idempotency_key:
+            venta_id = idempotencia.buscar(db, idempotency_key, "ventas")
+            if venta_id is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+                return cargar_venta(db, venta_id)
+        
+        # Líneas escaneadas por código: las que no estaban en el índice, en una consulta
+        no_encontrados = inventario.resolver_codigos(db, venta.items)
+        if no_encontrados:
+            raise HTTPException(status_code=404, detail=f"Código {no_encontrados[0]} no encontrado")
+        
+        # Validar stock (una sola consulta) y calcular total
+        cantidades = inventario.agrupar_cantidades(venta.items)
+        productos = inventario.cargar_productos(db, cantidades)
+        inventario.completar_precios(venta.items, productos)
+        
         total = 0
         items_data = []
         
         for item in venta.items:
-            producto = db.query(models.Producto).filter(models.Producto.id == item.producto_id).first()
-            if not producto:
-                raise HTTPException(status_code=404, detail=f"Producto {item.producto_id} no encontrado")
-            
-            if producto.stock < item.cantidad:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}"
-                )
-            
             subtotal = item.cantidad * item.precio_unitario
             total += subtotal
             items_data.append({
-                "producto": producto,
+                "producto_id": productos[item.producto_id].id,
                 "cantidad": item.cantidad,
                 "precio_unitario": item.precio_unitario,
                 "subtotal": subtotal
@@ -282,154 +474,417 @@ def crear_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
         db.add(nueva_venta)
         db.flush()
         
-        # Crear items y actualizar stock
-        for item_data in items_data:
-            venta_item = models.VentaItem(
-                venta_id=nueva_venta.id,
-                producto_id=item_data["producto"].id,
-                cantidad=item_data["cantidad"],
-                precio_unitario=item_data["precio_unitario"],
-                subtotal=item_data["subtotal"]
-            )
-            db.add(venta_item)
-            
-            # Actualizar stock
-            item_data["producto"].stock -= item_data["cantidad"]
+        # Crear items
+        db.add_all([
+            models.VentaItem(venta_id=nueva_venta.id, **item_data)
+            for item_data in items_data
+        ])
+        inventario.registrar_movimientos(db, inventario.salidas("venta", cantidades, nueva_venta.id))
         
+        # Descontar stock de forma atómica, al final para bloquear las filas el menor tiempo posible
+        inventario.descontar_stock(db, cantidades)
+        resumen.sumar_venta(db, total, venta.metodo_pago)
+        
+        if idempotency_key:
+            idempotencia.registrar(db, idempotency_key, "ventas", nueva_venta.id)
+        
+        venta_id = nueva_venta.id
         db.commit()
-        db.refresh(nueva_venta)
+        catalogo.publicar(db)
+        busqueda.indice.invalidar()
+        estadisticas.cache.invalidar()
+        nueva_venta = cargar_venta(db, venta_id)
+        eventos.publicar_stock(db, cantidades)
+        eventos.publicar_movimiento("venta", nueva_venta)
         return nueva_venta
         
     except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError:
+        # Otra petición con la misma Idempotency-Key se confirmó primero
+        db.rollback()
+        venta_id = idempotencia.buscar(db, idempotency_key, "ventas") if idempotency_key else None
+        if venta_id is None:
+            raise HTTPException(status_code=500, detail="Error de integridad al registrar la venta")
+        response.headers["Idempotent-Replayed"] = "true"
+        return cargar_venta(db, venta_id)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/ventas/batch", response_model=schemas.VentaBatchResponse)
+@asincrono.ruta_async(schemas.VentaBatchResponse, preparar=codigos_lote)
+def crear_ventas_batch(lote: schemas.VentaBatchCreate, db: Session = Depends(get_db)):
+    """Registrar un lote de ventas encoladas por una terminal sin conexión.
+    
+    El stock se valida para todo el lote en una pasada (en orden, con las filas
+    bloqueadas) y las ventas aceptadas se insertan y descuentan en una sola
+    transacción. Cada venta informa su propio resultado; las rechazadas no
+    afectan a las demás.
+    """
+    try:
+        claves = [v.idempotency_key for v in lote.ventas if v.idempotency_key]
+        repetidas = idempotencia.buscar_varias(db, claves, "ventas") if claves else {}
+        
+        # Códigos escaneados y productos de todo el lote, en una sola consulta cada uno.
+        # Las filas quedan bloqueadas: la validación de stock de abajo no puede quedar
+        # desfasada por otra venta y terminar en un 409 para todo el lote
+        inventario.resolver_codigos(db, [item for v in lote.ventas for item in v.items])
+        productos = inventario.obtener_productos(
+            db, {item.producto_id for v in lote.ventas for item in v.items if item.producto_id is not None},
+            bloquear=True
+        )
+        disponible = {producto_id: p.stock or 0 for producto_id, p in productos.items()}
+        
+        resultados = []
+        aceptadas = []  # (resultado, venta, idempotency_key)
+        claves_lote = {}
+        
+        for indice, venta in enumerate(lote.ventas):
+            resultado = schemas.VentaBatchResultado(indice=indice, ok=False)
+            resultados.append(resultado)
+            clave = venta.idempotency_key
+            
+            if clave in repetidas:
+                resultado.ok, resultado.repetida, resultado.venta_id = True, True, repetidas[clave]
+                continue
+            if clave in claves_lote:
+                # Misma clave dos veces en el lote: la segunda es un reintento de la primera
+                original = claves_lote[clave]
+                resultado.ok, resultado.repetida = original.ok, True
+                resultado.error = original.error
+                continue
+            if clave:
+                claves_lote[clave] = resultado
+            
+            sin_codigo = next((item.codigo for item in venta.items if item.producto_id is None), None)
+            if sin_codigo is not None:
+                resultado.error = f"Código {sin_codigo} no encontrado"
+                continue
+            
+            cantidades = inventario.agrupar_cantidades(venta.items)
+            faltante = next((pid for pid in cantidades if pid not in productos), None)
+            if faltante is not None:
+                resultado.error = f"Producto {faltante} no encontrado"
+                continue
+            inventario.completar_precios(venta.items, productos)
+            
+            sin_stock = [pid for pid, cantidad in cantidades.items() if disponible[pid] < cantidad]
+            if sin_stock:
+                resultado.error = "; ".join(
+                    f"Stock insuficiente para {productos[pid].nombre}. Disponible: {disponible[pid]}"
+                    for pid in sin_stock
+                )
+                continue
+            
+            for producto_id, cantidad in cantidades.items():
+                disponible[producto_id] -= cantidad
+            
+            resultado.ok = True
+            aceptadas.append((resultado, models.Venta(
+                total=sum(item.cantidad * item.precio_unitario for item in venta.items),
+                metodo_pago=venta.metodo_pago,
+                # Hora de la terminal en UTC naive, como el resto de created_at (y el resumen)
+                created_at=exportar.normalizar_fecha(venta.created_at),
+                items=[
+                    models.VentaItem(
+                        producto_id=item.producto_id,
+                        cantidad=item.cantidad,
+                        precio_unitario=item.precio_unitario,
+                        subtotal=item.cantidad * item.precio_unitario
+                    )
+                    for item in venta.items
+                ]
+            ), clave))
+        
+        if aceptadas:
+            db.add_all([nueva_venta for _, nueva_venta, _ in aceptadas])
+            db.flush()
+            
+            # Cada clave en su propio savepoint: si otra petición con la misma clave se
+            # confirmó entretanto, solo esa venta se descarta y se informa la original
+            confirmadas = []
+            for resultado, nueva_venta, clave in aceptadas:
+                if clave:
+                    try:
+                        with db.begin_nested():
+                            idempotencia.registrar(db, clave, "ventas", nueva_venta.id)
+                            db.flush()
+                    except IntegrityError:
+                        db.delete(nueva_venta)
+                        original = idempotencia.buscar(db, clave, "ventas")
+                        resultado.repetida, resultado.venta_id = True, original
+                        if original is None:
+                            resultado.ok = False
+                            resultado.error = "Venta en proceso por otra petición con la misma Idempotency-Key, reintente"
+                        continue
+                resultado.venta_id = nueva_venta.id
+                confirmadas.append((resultado, nueva_venta))
+            
+            movimientos = []
+            totales = {}
+            descontar = {}
+            for resultado, nueva_venta in confirmadas:
+                cantidades = inventario.agrupar_cantidades(nueva_venta.items)
+                movimientos.extend(inventario.salidas("venta", cantidades, nueva_venta.id))
+                for producto_id, cantidad in cantidades.items():
+                    descontar[producto_id] = descontar.get(producto_id, 0) + cantidad
+                dia = (resumen.fecha_de(lote.ventas[resultado.indice].created_at), "venta", nueva_venta.metodo_pago)
+                total, cantidad = totales.get(dia, (0, 0))
+                totales[dia] = (total + nueva_venta.total, cantidad + 1)
+            inventario.registrar_movimientos(db, movimientos)
+            
+            # Un único UPDATE condicional para el total del lote
+            if descontar:
+                inventario.descontar_stock(db, descontar)
+            resumen.sumar(db, totales)
+            
+            db.commit()
+            catalogo.publicar(db)
+            busqueda.indice.invalidar()
+            estadisticas.cache.invalidar()
+            
+            eventos.publicar_stock(db, descontar)
+            if eventos.bus.hay_suscriptores():
+                for nueva_venta in db.query(
+                    models.Venta.id, models.Venta.total, models.Venta.metodo_pago, models.Venta.created_at
+                ).filter(models.Venta.id.in_([resultado.venta_id for resultado, _ in confirmadas])):
+                    eventos.publicar_movimiento("venta", nueva_venta)
+        
+        # Las repeticiones dentro del lote apuntan a la venta original
+        for resultado in resultados:
+            if resultado.repetida and resultado.venta_id is None:
+                original = claves_lote.get(lote.ventas[resultado.indice].idempotency_key)
+                resultado.venta_id = original.venta_id if original else None
+        
+        procesadas = sum(1 for resultado in resultados if resultado.ok)
+        logger.info(f"Lote de ventas: {procesadas} procesadas, {len(resultados) - procesadas} fallidas")
+        return schemas.VentaBatchResponse(
+            procesadas=procesadas,
+            fallidas=len(resultados) - procesadas,
+            resultados=resultados
+        )
+        
+    except HTTPException:
+        db.rollback()
         raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/ventas", response_model=List[schemas.VentasList])
+@asincrono.ruta_async(List[schemas.VentasList], dependencia=lectura.get_sesion_lectura)
 def listar_ventas(
-    skip: int = 0,
-    limit: int = 50,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Valor del header X-Next-Cursor de la página anterior"),
+    limit: int = Query(50, ge=1, le=settings.max_page_historial),
     db: Session = Depends(get_db)
 ):
-    """Listar ventas"""
-    ventas = db.query(models.Venta).order_by(models.Venta.created_at.desc()).offset(skip).limit(limit).all()
+    """Listar ventas, de la más reciente a la más antigua (cursor en X-Next-Cursor)"""
+    ventas, siguiente = paginacion.recientes(db.query(models.Venta), models.Venta, cursor, limit)
+    if siguiente:
+        response.headers[paginacion.HEADER_SIGUIENTE] = siguiente
     return ventas
 
 @app.get("/api/ventas/{venta_id}", response_model=schemas.VentaResponse)
+@asincrono.ruta_async(schemas.VentaResponse)
 def obtener_venta(venta_id: int, db: Session = Depends(get_db)):
     """Obtener detalle de una venta"""
-    venta = db.query(models.Venta).filter(models.Venta.id == venta_id).first()
+    venta = cargar_venta(db, venta_id)
     if not venta:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return venta
 
 @app.get("/api/estadisticas")
-def obtener_estadisticas(db: Session = Depends(get_db)):
-    """Obtener estadísticas básicas"""
-    from sqlalchemy import func, desc
-    from datetime import datetime, timedelta
-    
-    # Ventas del día
-    hoy = datetime.now().date()
-    ventas_hoy = db.query(func.sum(models.Venta.total)).filter(
-        func.date(models.Venta.created_at) == hoy
-    ).scalar() or 0
-    
-    # Total productos
-    total_productos = db.query(models.Producto).filter(models.Producto.activo == True).count()
-    
-    # Productos con stock bajo
-    productos_bajo_stock = db.query(models.Producto).filter(
-        models.Producto.stock < models.Producto.stock_minimo,
-        models.Producto.activo == True
-    ).count()
-    
-    # Última venta
-    ultima_venta = db.query(models.Venta).order_by(desc(models.Venta.created_at)).first()
+def obtener_estadisticas(db: Session = Depends(lectura.get_db_lectura)):
+    """Obtener estadísticas básicas (desde memoria mientras no haya escrituras)"""
+    return estadisticas.cache.obtener(lambda: estadisticas.calcular(db))
+
+# ============== EVENTOS EN VIVO ==============
+
+@app.get("/api/eventos")
+async def stream_eventos(request: Request):
+    """Server-Sent Events: stock, producto, venta, retiro (y resync si el cliente se atrasa)"""
+    return StreamingResponse(
+        eventos.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============== RUTAS DE INVENTARIO ==============
+
+@app.get("/api/inventario/stock", response_model=List[schemas.StockEnFecha])
+def stock_en_fecha(
+    fecha: datetime,
+    producto_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Stock de los productos en una fecha, calculado desde el ledger (snapshot + cola)"""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
     
-    # Retiros del día (pérdidas)
-    retiros_hoy = db.query(func.sum(models.Retiro.total)).filter(
-        func.date(models.Retiro.created_at) == func.date(func.now())
-    ).scalar() or 0
+    stock = inventario.stock_en(db, fecha, producto_id)
+    return [
+        {"producto_id": id_producto, "fecha": fecha, "stock": cantidad}
+        for id_producto, cantidad in stock.items()
+    ]
+
+# ============== REPORTES ==============
+
+@app.get("/api/reportes/ventas", response_model=schemas.ReporteVentas)
+def reporte_ventas(
+    bucket: str = Query("day", description="hour, day, week o month"),
+    group_by: Optional[str] = Query(None, description="producto, categoria, marca o metodo_pago"),
+    desde: Optional[Union[datetime, date]] = Query(None, alias="from", description="Desde (inclusive, por defecto hace 30 días)"),
+    hasta: Optional[Union[datetime, date]] = Query(
+        None, alias="to", description="Hasta (exclusive; una fecha sin hora incluye ese día completo)"
+    ),
+    db: Session = Depends(lectura.get_db_lectura)
+):
+    """Ingresos, unidades y margen bruto por período y grupo"""
+    hasta = exportar.normalizar_fecha(hasta, fin_de_dia=True) or datetime.utcnow()
+    desde = exportar.normalizar_fecha(desde) or hasta - timedelta(days=30)
+    return reportes.ventas(db, bucket, desde, hasta, group_by)
+
+# ============== EXPORTACIÓN ==============
+
+@app.get("/api/export/{tabla}")
+def exportar_tabla(
+    tabla: str,
+    desde: Optional[Union[datetime, date]] = Query(None, alias="from", description="Desde (inclusive)"),
+    hasta: Optional[Union[datetime, date]] = Query(
+        None, alias="to", description="Hasta (exclusive; una fecha sin hora incluye ese día completo)"
+    ),
+    formato: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")
+):
+    """Exportar ventas, venta_items, productos o retiros completos como NDJSON o CSV (en streaming)"""
+    if tabla not in exportar.CONSULTAS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Exportación no disponible. Opciones: {', '.join(exportar.CONSULTAS)}"
+        )
+    desde = exportar.normalizar_fecha(desde)
+    hasta = exportar.normalizar_fecha(hasta, fin_de_dia=True)
+    if desde and hasta and desde >= hasta:
+        raise HTTPException(status_code=400, detail="'from' debe ser anterior a 'to'")
     
-    return {
-        "ventas_hoy": ventas_hoy,
-        "retiros_hoy": retiros_hoy,
-        "utilidad_neta": ventas_hoy - retiros_hoy,
-        "total_productos": total_productos,
-        "productos_bajo_stock": productos_bajo_stock,
-        "ultima_venta": ultima_venta.created_at if ultima_venta else None
-    }
+    logger.info(f"📤 Exportando {tabla} ({formato}) desde={desde} hasta={hasta}")
+    extension = "csv" if formato == "csv" else "ndjson"
+    return StreamingResponse(
+        exportar.exportar(tabla, formato, desde, hasta),
+        media_type=exportar.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{tabla}.{extension}"'}
+    )
 
 # ============== RUTAS DE RETIROS ==============
 
+def cargar_retiro(db: Session, retiro_id: int):
+    """Retiro con sus líneas y el nombre de cada producto en dos consultas fijas (ver cargar_venta)"""
+    return db.query(models.Retiro).options(
+        selectinload(models.Retiro.items).joinedload(models.RetiroItem.producto).load_only(models.Producto.nombre),
+        raiseload("*")
+    ).populate_existing().filter(models.Retiro.id == retiro_id).first()
+
 @app.post("/api/retiros", response_model=schemas.RetiroResponse, status_code=201)
-def crear_retiro(retiro: schemas.RetiroCreate, db: Session = Depends(get_db)):
+@asincrono.ruta_async(schemas.RetiroResponse)
+def crear_retiro(
+    retiro: schemas.RetiroCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=100),
+    db: Session = Depends(get_db)
+):
     """Registrar retiro/consumo interno"""
-    
-    # Validar stock y calcular total
-    total = 0
-    items_data = []
-    
-    for item in retiro.items:
-        producto = db.query(models.Producto).filter(models.Producto.id == item.producto_id).first()
-        if not producto:
-            raise HTTPException(status_code=404, detail=f"Producto {item.producto_id} no encontrado")
-        
-        if producto.stock < item.cantidad:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Stock insuficiente para {producto.nombre}. Stock actual: {producto.stock}"
-            )
-        
-        subtotal = producto.precio_venta * item.cantidad
-        total += subtotal
-        
-        items_data.append({
-            "producto": producto,
-            "cantidad": item.cantidad,
-            "precio_unitario": producto.precio_venta,
-            "subtotal": subtotal
-        })
-    
-    # Crear retiro
-    nuevo_retiro = models.Retiro(total=total)
-    db.add(nuevo_retiro)
-    db.flush()
-    
-    # Crear items y actualizar stock
-    for item_data in items_data:
-        retiro_item = models.RetiroItem(
-            retiro_id=nuevo_retiro.id,
-            producto_id=item_data["producto"].id,
-            cantidad=item_data["cantidad"],
-            precio_unitario=item_data["precio_unitario"],
-            subtotal=item_data["subtotal"]
-        )
-        db.add(retiro_item)
+    try:
+        # Reintento de una terminal: devolver el retiro original sin tocar inventario
+        if idempotency_key:
+            retiro_id = idempotencia.buscar(db, idempotency_key, "retiros")
+            if retiro_id is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+                return cargar_retiro(db, retiro_id)
         
-        # Reducir stock
-        item_data["producto"].stock -= item_data["cantidad"]
-    
-    db.commit()
-    db.refresh(nuevo_retiro)
-    return nuevo_retiro
+        # Validar stock (una sola consulta) y calcular total
+        cantidades = inventario.agrupar_cantidades(retiro.items)
+        productos = inventario.cargar_productos(db, cantidades)
+        
+        total = 0
+        items_data = []
+        
+        for item in retiro.items:
+            producto = productos[item.producto_id]
+            subtotal = producto.precio_venta * item.cantidad
+            total += subtotal
+            
+            items_data.append({
+                "producto_id": producto.id,
+                "cantidad": item.cantidad,
+                "precio_unitario": producto.precio_venta,
+                "subtotal": subtotal
+            })
+        
+        # Crear retiro
+        nuevo_retiro = models.Retiro(total=total)
+        db.add(nuevo_retiro)
+        db.flush()
+        
+        # Crear items
+        db.add_all([
+            models.RetiroItem(retiro_id=nuevo_retiro.id, **item_data)
+            for item_data in items_data
+        ])
+        inventario.registrar_movimientos(db, inventario.salidas("retiro", cantidades, nuevo_retiro.id))
+        
+        # Reducir stock de forma atómica, al final para bloquear las filas el menor tiempo posible
+        inventario.descontar_stock(db, cantidades)
+        resumen.sumar_retiro(db, total)
+        
+        if idempotency_key:
+            idempotencia.registrar(db, idempotency_key, "retiros", nuevo_retiro.id)
+        
+        retiro_id = nuevo_retiro.id
+        db.commit()
+        catalogo.publicar(db)
+        busqueda.indice.invalidar()
+        estadisticas.cache.invalidar()
+        nuevo_retiro = cargar_retiro(db, retiro_id)
+        eventos.publicar_stock(db, cantidades)
+        eventos.publicar_movimiento("retiro", nuevo_retiro)
+        return nuevo_retiro
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError:
+        # Otra petición con la misma Idempotency-Key se confirmó primero
+        db.rollback()
+        retiro_id = idempotencia.buscar(db, idempotency_key, "retiros") if idempotency_key else None
+        if retiro_id is None:
+            raise HTTPException(status_code=500, detail="Error de integridad al registrar el retiro")
+        response.headers["Idempotent-Replayed"] = "true"
+        return cargar_retiro(db, retiro_id)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/retiros", response_model=List[schemas.RetirosList])
+@asincrono.ruta_async(List[schemas.RetirosList])
 def listar_retiros(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Valor del header X-Next-Cursor de la página anterior"),
+    limit: int = Query(100, ge=1, le=settings.max_page_historial),
     db: Session = Depends(get_db)
 ):
-    """Listar retiros/consumos"""
-    retiros = db.query(models.Retiro).order_by(desc(models.Retiro.created_at)).offset(skip).limit(limit).all()
+    """Listar retiros/consumos, del más reciente al más antiguo (cursor en X-Next-Cursor)"""
+    retiros, siguiente = paginacion.recientes(db.query(models.Retiro), models.Retiro, cursor, limit)
+    if siguiente:
+        response.headers[paginacion.HEADER_SIGUIENTE] = siguiente
     return retiros
 
 @app.get("/api/retiros/{retiro_id}", response_model=schemas.RetiroResponse)
+@asincrono.ruta_async(schemas.RetiroResponse)
 def obtener_retiro(retiro_id: int, db: Session = Depends(get_db)):
     """Obtener detalles de un retiro"""
-    retiro = db.query(models.Retiro).filter(models.Retiro.id == retiro_id).first()
+    retiro = cargar_retiro(db, retiro_id)
     if not retiro:
         raise HTTPException(status_code=404, detail="Retiro no encontrado")
     return retiro
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Migraciones versionadas de la base (SQLite y MySQL).
+
+Cada migración tiene un número de versión y se registra en
+``schema_migrations`` al aplicarse; al iniciar la aplicación solo se
+ejecutan las pendientes, y si no hay ninguna no se toca el esquema. Los
+pasos revisan lo que ya existe (tablas, columnas, índices), así que una
+base creada con ``create_all`` o migrada a mano queda igual.
+
+Es seguro correrlas al iniciar con varios workers: en MySQL se serializan
+con ``GET_LOCK`` y los índices se crean con ``ALGORITHM=INPLACE, LOCK=NONE``
+(sin bloquear ventas); en SQLite el lock de escritura de la base ya las
+serializa y un registro duplicado de versión se ignora.
+
+Uso manual:
+    python migraciones.py
+"""
+
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import case, func, inspect, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+import models
+import resumen
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_LOCK = "botilleria_migraciones"
+
+
+# ============== PASOS ==============
+
+def crear_indices(conexion, modelo, *nombres) -> None:
+    """Crear los índices del modelo indicados que aún no existan en la base"""
+    existentes = {indice["name"] for indice in inspect(conexion).get_indexes(modelo.__tablename__)}
+    for indice in modelo.__table__.indexes:
+        if indice.name not in nombres or indice.name in existentes:
+            continue
+        ddl = str(CreateIndex(indice).compile(dialect=conexion.dialect))
+        if conexion.dialect.name == "mysql":
+            ddl += " ALGORITHM=INPLACE LOCK=NONE"
+        logger.info(f"➕ Índice {indice.name}")
+        conexion.exec_driver_sql(ddl)
+
+
+def agregar_columnas(conexion, modelo, *nombres) -> None:
+    """Agregar (nullable) las columnas del modelo indicadas que aún no existan"""
+    existentes = {columna["name"] for columna in inspect(conexion).get_columns(modelo.__tablename__)}
+    for nombre in nombres:
+        if nombre in existentes:
+            continue
+        tipo = modelo.__table__.c[nombre].type.compile(dialect=conexion.dialect)
+        logger.info(f"➕ Columna {modelo.__tablename__}.{nombre}")
+        conexion.exec_driver_sql(f"ALTER TABLE {modelo.__tablename__} ADD COLUMN {nombre} {tipo}")
+
+
+def _tablas(conexion) -> None:
+    # Solo crea las tablas que falten (ledger, resumen diario, idempotencia, etc.)
+    models.Base.metadata.create_all(bind=conexion)
+
+
+def _unidades(conexion) -> None:
+    # Reemplaza migrate_unidades.py: cantidad/unidad_medida a partir de litros
+    agregar_columnas(conexion, models.Producto, "cantidad", "unidad_medida")
+    litros = models.Producto.litros
+    conexion.execute(
+        update(models.Producto)
+        .where(litros > 0, func.coalesce(models.Producto.unidad_medida, "") == "")
+        .values(
+            cantidad=case((litros >= 1, litros), else_=func.round(litros * 1000)),
+            unidad_medida=case((litros >= 1, "L"), else_="ml")
+        )
+    )
+
+
+def _indices_historial(conexion) -> None:
+    crear_indices(conexion, models.Venta, "ix_ventas_created_at_id")
+    crear_indices(conexion, models.Retiro, "ix_retiros_created_at_id")
+    crear_indices(conexion, models.VentaItem, "ix_venta_items_venta_id_producto_id", "ix_venta_items_producto_id")
+    crear_indices(conexion, models.RetiroItem, "ix_retiro_items_retiro_id_producto_id", "ix_retiro_items_producto_id")
+
+
+def _indices_productos(conexion) -> None:
+    crear_indices(
+        conexion, models.Producto,
+        "ix_productos_updated_at", "ix_productos_activo_categoria", "ix_productos_activo_stock"
+    )
+
+
+def _version_catalogo(conexion) -> None:
+    # Cursor del catálogo en orden de commit (ver catalogo.py) en vez de ids máximos
+    models.VersionCatalogo.__table__.create(conexion, checkfirst=True)
+    if conexion.scalar(select(models.VersionCatalogo.id).where(models.VersionCatalogo.id == 1)) is None:
+        conexion.execute(insert(models.VersionCatalogo).values(id=1, version=0))
+    agregar_columnas(conexion, models.MovimientoStock, "version")
+    agregar_columnas(conexion, models.CambioProducto, "version")
+    crear_indices(conexion, models.MovimientoStock, "ix_stock_movements_version_producto_id")
+    crear_indices(conexion, models.CambioProducto, "ix_producto_cambios_version_producto_id")
+
+
+def _resumen_diario(conexion) -> None:
+    # La tabla se creó vacía (migración 1): sin esto estadísticas y reportes mostrarían
+    # 0 para el historial y para las ventas del día anteriores al deploy
+    filas = resumen.reconstruir(conexion)
+    logger.info(f"📊 Resumen diario reconstruido: {filas} filas")
+
+
+# Nunca cambiar el número de una migración ya publicada: solo agregar al final
+MIGRACIONES = [
+    (1, "tablas", _tablas),
+    (2, "unidades_medida", _unidades),
+    (3, "indices_historial", _indices_historial),
+    (4, "indices_productos", _indices_productos),
+    (5, "version_catalogo", _version_catalogo),
+    (6, "resumen_diario", _resumen_diario),
+]
+
+
+# ============== EJECUCIÓN ==============
+
+def pendientes(conexion) -> list:
+    if not inspect(conexion).has_table(models.MigracionAplicada.__tablename__):
+        return list(MIGRACIONES)
+    aplicadas = set(conexion.scalars(select(models.MigracionAplicada.version)))
+    return [migracion for migracion in MIGRACIONES if migracion[0] not in aplicadas]
+
+
+@contextmanager
+def _bloqueo(conexion):
+    """Un solo proceso migrando a la vez (MySQL); SQLite ya serializa las escrituras"""
+    if conexion.dialect.name != "mysql":
+        yield
+        return
+    conexion.exec_driver_sql(f"SELECT GET_LOCK('{NOMBRE_LOCK}', 300)")
+    try:
+        yield
+    finally:
+        conexion.exec_driver_sql(f"SELECT RELEASE_LOCK('{NOMBRE_LOCK}')")
+
+
+def migrar(bind=engine) -> list:
+    """Aplicar las migraciones pendientes en orden; retorna las versiones aplicadas"""
+    aplicadas = []
+    with bind.connect() as conexion:
+        if not pendientes(conexion):
+            conexion.rollback()
+            return aplicadas
+
+        with _bloqueo(conexion):
+            models.MigracionAplicada.__table__.create(conexion, checkfirst=True)
+            conexion.commit()
+
+            # Releer dentro del lock: otro worker pudo haber migrado mientras esperábamos
+            for version, nombre, funcion in pendientes(conexion):
+                logger.info(f"🔄 Migración {version}: {nombre}")
+                funcion(conexion)
+                try:
+                    conexion.execute(insert(models.MigracionAplicada).values(version=version, nombre=nombre))
+                    conexion.commit()
+                except IntegrityError:
+                    conexion.rollback()
+                    logger.info(f"✓ Migración {version} ya registrada por otro proceso")
+                aplicadas.append(version)
+    return aplicadas
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    versiones = migrar()
+    print(f"✅ Migraciones aplicadas: {versiones}" if versiones else "✓ Base al día, sin migraciones pendientes")
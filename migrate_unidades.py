@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Script de migración para agregar campos de cantidad y unidad_medida
+
+Obsoleto: ahora es la migración 2 de migraciones.py, que se aplica sola al
+iniciar y también funciona en MySQL.
 """
 
 import os
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -37,7 +37,14 @@ class Producto(Base):
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), index=True)
+    
+    __table_args__ = (
+        # Listados del POS filtrados por categoría
+        Index("ix_productos_activo_categoria", "activo", "categoria"),
+        # Conteo de stock bajo (stock < stock_minimo) sin leer la tabla
+        Index("ix_productos_activo_stock", "activo", "stock", "stock_minimo"),
+    )
     
     def __repr__(self):
         return f"<Producto(codigo={self.codigo}, nombre={self.nombre}, precio_venta={self.precio_venta})>"
@@ -53,6 +60,11 @@ class Venta(Base):
     # Relación con items
     items = relationship("VentaItem", back_populates="venta", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Paginación por cursor del historial: ORDER BY created_at DESC, id DESC
+        Index("ix_ventas_created_at_id", "created_at", "id"),
+    )
+    
     def __repr__(self):
         return f"<Venta(id={self.id}, total={self.total})>"
 
@@ -69,6 +81,17 @@ class VentaItem(Base):
     # Relaciones
     venta = relationship("Venta", back_populates="items")
     producto = relationship("Producto")
+    
+    @property
+    def producto_nombre(self):
+        # Cargado junto con las líneas en el detalle (ver cargar_venta/cargar_retiro en main.py)
+        return self.producto.nombre if self.producto is not None else None
+    
+    __table_args__ = (
+        # Ítems de un rango de ventas y su producto (reportes) sin leer la tabla
+        Index("ix_venta_items_venta_id_producto_id", "venta_id", "producto_id"),
+        Index("ix_venta_items_producto_id", "producto_id"),
+    )
 
 class Retiro(Base):
     __tablename__ = "retiros"
@@ -80,6 +103,10 @@ class Retiro(Base):
     # Relación con items
     items = relationship("RetiroItem", back_populates="retiro", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        Index("ix_retiros_created_at_id", "created_at", "id"),
+    )
+    
     def __repr__(self):
         return f"<Retiro(id={self.id}, total={self.total})>"
 
@@ -97,5 +124,112 @@ class RetiroItem(Base):
     retiro = relationship("Retiro", back_populates="items")
     producto = relationship("Producto")
     
+    @property
+    def producto_nombre(self):
+        # Cargado junto con las líneas en el detalle (ver cargar_venta/cargar_retiro en main.py)
+        return self.producto.nombre if self.producto is not None else None
+    
+    __table_args__ = (
+        Index("ix_retiro_items_retiro_id_producto_id", "retiro_id", "producto_id"),
+        Index("ix_retiro_items_producto_id", "producto_id"),
+    )
+    
     def __repr__(self):
         return f"<VentaItem(producto_id={self.producto_id}, cantidad={self.cantidad})>"
+
+class ClaveIdempotencia(Base):
+    __tablename__ = "idempotency_keys"
+    
+    # Valor del header Idempotency-Key enviado por la terminal
+    clave = Column(String(100), primary_key=True)
+    endpoint = Column(String(50), nullable=False)  # ventas, retiros
+    recurso_id = Column(Integer, nullable=False)  # id de la venta/retiro creado
+    expira_at = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<ClaveIdempotencia(clave={self.clave}, endpoint={self.endpoint}, recurso_id={self.recurso_id})>"
+
+class MovimientoStock(Base):
+    __tablename__ = "stock_movements"
+    
+    # Ledger de inventario: solo se agregan filas, nunca se modifican
+    id = Column(Integer, primary_key=True, index=True)
+    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
+    tipo = Column(String(20), nullable=False)  # venta, retiro, reposicion, ajuste
+    cantidad = Column(Integer, nullable=False)  # positivo entra, negativo sale
+    referencia_id = Column(Integer, nullable=True)  # id de la venta/retiro que lo originó
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Versión del catálogo en que se publicó (ver catalogo.py); negativa mientras está
+    # pendiente de publicar, NULL en filas anteriores
+    version = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_stock_movements_producto_id_id", "producto_id", "id"),
+        Index("ix_stock_movements_version_producto_id", "version", "producto_id"),
+    )
+    
+    def __repr__(self):
+        return f"<MovimientoStock(producto_id={self.producto_id}, tipo={self.tipo}, cantidad={self.cantidad})>"
+
+class SnapshotStock(Base):
+    __tablename__ = "stock_snapshots"
+    
+    # Stock compactado de un producto: incluye todos los movimientos hasta movimiento_id
+    id = Column(Integer, primary_key=True, index=True)
+    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
+    stock = Column(Integer, nullable=False)
+    movimiento_id = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_stock_snapshots_producto_id_created_at", "producto_id", "created_at"),
+    )
+    
+    def __repr__(self):
+        return f"<SnapshotStock(producto_id={self.producto_id}, stock={self.stock}, movimiento_id={self.movimiento_id})>"
+
+class CambioProducto(Base):
+    __tablename__ = "producto_cambios"
+    
+    # Registro de ediciones de productos (alta, precio, nombre, baja). Los cambios
+    # de stock ya quedan en stock_movements; la versión de ambos es el cursor de sincronización.
+    id = Column(Integer, primary_key=True, index=True)
+    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    version = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_producto_cambios_id_producto_id", "id", "producto_id"),
+        Index("ix_producto_cambios_version_producto_id", "version", "producto_id"),
+    )
+
+class VersionCatalogo(Base):
+    __tablename__ = "catalogo_version"
+    
+    # id=1: versión publicada del catálogo; cada publicación la incrementa en una
+    # transacción corta, así las versiones quedan en orden (ver catalogo.py).
+    # id=2: barrera de compactar_stock (version = compactaciones realizadas)
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class MigracionAplicada(Base):
+    __tablename__ = "schema_migrations"
+    
+    # Versiones aplicadas por migraciones.py
+    version = Column(Integer, primary_key=True)
+    nombre = Column(String(100), nullable=False)
+    aplicada_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ResumenDiario(Base):
+    __tablename__ = "resumen_diario"
+    
+    # Totales por día, mantenidos en la misma transacción que cada venta/retiro.
+    # tipo: venta (una fila por metodo_pago) o retiro (metodo_pago vacío)
+    fecha = Column(Date, primary_key=True)
+    tipo = Column(String(20), primary_key=True)
+    metodo_pago = Column(String(50), primary_key=True, default="")
+    total = Column(Float, nullable=False, default=0)
+    cantidad = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<ResumenDiario(fecha={self.fecha}, tipo={self.tipo}, metodo_pago={self.metodo_pago}, total={self.total})>"
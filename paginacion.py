@@ -0,0 +1,65 @@
+"""
+Paginación por cursor (keyset) para los listados de productos, ventas y retiros.
+
+En vez de ``OFFSET`` (que recorre y descarta todas las filas anteriores) cada
+página continúa desde la última fila de la anterior usando el índice, así que
+la página 1000 cuesta lo mismo que la primera. El cursor es opaco para el
+cliente y solo contiene el id de la última fila entregada; se devuelve en el
+header ``X-Next-Cursor`` y no viene cuando no hay más páginas.
+"""
+
+import base64
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+
+HEADER_SIGUIENTE = "X-Next-Cursor"
+
+
+def codificar(fila_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{fila_id}".encode()).decode().rstrip("=")
+
+
+def decodificar(cursor: str) -> int:
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefijo, fila_id = texto.split(":")
+        if prefijo != "id":
+            raise ValueError(cursor)
+        return int(fila_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def _pagina(query, limite: int) -> Tuple[list, Optional[str]]:
+    """Traer una fila de más para saber si hay página siguiente sin contar"""
+    filas = query.limit(limite + 1).all()
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar(filas[-1].id)
+
+
+def por_id(query, modelo, cursor: Optional[str], limite: int) -> Tuple[list, Optional[str]]:
+    """Página ordenada por id ascendente (catálogo de productos)"""
+    if cursor:
+        query = query.filter(modelo.id > decodificar(cursor))
+    return _pagina(query.order_by(modelo.id), limite)
+
+
+def recientes(query, modelo, cursor: Optional[str], limite: int) -> Tuple[list, Optional[str]]:
+    """Página ordenada por (created_at, id) descendente (ventas y retiros).
+
+    El created_at de la última fila se lee en la misma consulta a partir de su
+    id, así la comparación la hace la base con el mismo tipo y formato que el
+    ORDER BY (en SQLite conviven fechas con y sin microsegundos).
+    """
+    if cursor:
+        ultimo_id = decodificar(cursor)
+        ultimo_created_at = select(modelo.created_at).where(modelo.id == ultimo_id).scalar_subquery()
+        query = query.filter(or_(
+            modelo.created_at < ultimo_created_at,
+            and_(modelo.created_at == ultimo_created_at, modelo.id < ultimo_id)
+        ))
+    return _pagina(query.order_by(modelo.created_at.desc(), modelo.id.desc()), limite)
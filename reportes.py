@@ -0,0 +1,105 @@
+"""
+Reportes de ventas agregados por período (hora, día, semana, mes) y
+opcionalmente por producto, categoría, marca o método de pago.
+
+Se agrega venta_items unido a ventas (rango sobre created_at, sin funciones
+sobre la columna, usando el índice (created_at, id)) y a productos. El costo
+y el margen usan el precio_compra actual del producto: venta_items no guarda
+el costo histórico.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import models
+
+BUCKETS = ("hour", "day", "week", "month")
+AGRUPACIONES = {
+    "producto": (models.Producto.nombre, models.Producto.id),
+    "categoria": (models.Producto.categoria, None),
+    "marca": (models.Producto.marca, None),
+    "metodo_pago": (models.Venta.metodo_pago, None),
+}
+
+
+def _periodo(db: Session, bucket: str):
+    """Expresión del inicio de período de cada venta (texto), según la base"""
+    fecha = models.Venta.created_at
+    if db.get_bind().dialect.name == "mysql":
+        return {
+            "hour": func.date_format(fecha, "%Y-%m-%d %H:00"),
+            "day": func.date_format(fecha, "%Y-%m-%d"),
+            # Semanas de lunes a domingo, como en SQLite
+            "week": func.date_format(func.subdate(fecha, func.weekday(fecha)), "%Y-%m-%d"),
+            "month": func.date_format(fecha, "%Y-%m"),
+        }[bucket]
+    return {
+        "hour": func.strftime("%Y-%m-%d %H:00", fecha),
+        "day": func.date(fecha),
+        "week": func.date(fecha, "weekday 0", "-6 days"),
+        "month": func.strftime("%Y-%m", fecha),
+    }[bucket]
+
+
+def ventas(db: Session, bucket: str, desde: datetime, hasta: datetime, group_by: Optional[str] = None) -> dict:
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket inválido. Opciones: {', '.join(BUCKETS)}")
+    if group_by is not None and group_by not in AGRUPACIONES:
+        raise HTTPException(status_code=400, detail=f"group_by inválido. Opciones: {', '.join(AGRUPACIONES)}")
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="'from' debe ser anterior a 'to'")
+
+    periodo = _periodo(db, bucket).label("periodo")
+    unidades = func.sum(models.VentaItem.cantidad).label("unidades")
+    ingresos = func.sum(models.VentaItem.subtotal).label("ingresos")
+    costo = func.sum(models.VentaItem.cantidad * func.coalesce(models.Producto.precio_compra, 0)).label("costo")
+
+    columnas = [periodo]
+    agrupar = [periodo]
+    if group_by is not None:
+        grupo, grupo_id = AGRUPACIONES[group_by]
+        columnas.append(grupo.label("grupo"))
+        agrupar.append(grupo)
+        if grupo_id is not None:
+            columnas.append(grupo_id.label("grupo_id"))
+            agrupar.append(grupo_id)
+
+    query = db.query(*columnas, unidades, ingresos, costo).select_from(models.Venta).join(
+        models.VentaItem, models.VentaItem.venta_id == models.Venta.id
+    ).join(
+        models.Producto, models.VentaItem.producto_id == models.Producto.id
+    ).filter(
+        models.Venta.created_at >= desde,
+        models.Venta.created_at < hasta
+    ).group_by(*agrupar).order_by(periodo, ingresos.desc())
+
+    filas = []
+    totales = {"unidades": 0, "ingresos": 0.0, "costo": 0.0}
+    for fila in query:
+        margen = (fila.ingresos or 0) - (fila.costo or 0)
+        filas.append({
+            "periodo": str(fila.periodo),
+            "grupo": getattr(fila, "grupo", None),
+            "grupo_id": getattr(fila, "grupo_id", None),
+            "unidades": int(fila.unidades or 0),
+            "ingresos": fila.ingresos or 0,
+            "costo": fila.costo or 0,
+            "margen": margen,
+            "margen_pct": round(margen / fila.ingresos * 100, 2) if fila.ingresos else None,
+        })
+        totales["unidades"] += int(fila.unidades or 0)
+        totales["ingresos"] += fila.ingresos or 0
+        totales["costo"] += fila.costo or 0
+
+    return {
+        "bucket": bucket,
+        "group_by": group_by,
+        "desde": desde,
+        "hasta": hasta,
+        "filas": filas,
+        **totales,
+        "margen": totales["ingresos"] - totales["costo"],
+    }
@@ -0,0 +1,115 @@
+"""
+Resumen diario de ventas y retiros (tabla ``resumen_diario``).
+
+Cada venta/retiro suma su total a la fila de su día en la misma transacción,
+así /api/estadisticas lee unas pocas filas del día en vez de recorrer todo
+el historial. ``reconstruir`` recalcula la tabla completa desde ventas y
+retiros (ver backfill_resumen.py).
+
+El día de un movimiento es la fecha UTC de su created_at, igual que lo
+guarda la base (CURRENT_TIMESTAMP / NOW() en el servidor de Railway).
+"""
+
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+
+def fecha_de(momento: Optional[datetime] = None) -> date:
+    """Día (UTC) al que se suma un movimiento; sin momento, hoy"""
+    if momento is None:
+        return datetime.utcnow().date()
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(timezone.utc)
+    return momento.date()
+
+
+def sumar(db: Session, totales: dict) -> None:
+    """Sumar {(fecha, tipo, metodo_pago): (total, cantidad)} a sus filas del resumen.
+
+    UPDATE de la fila y, si aún no existe (primer movimiento del día), INSERT
+    dentro de un savepoint: si otra transacción la creó entretanto se reintenta
+    el UPDATE.
+    """
+    for (fecha, tipo, metodo_pago), (total, cantidad) in totales.items():
+        clave = (
+            (models.ResumenDiario.fecha == fecha)
+            & (models.ResumenDiario.tipo == tipo)
+            & (models.ResumenDiario.metodo_pago == metodo_pago)
+        )
+        incremento = update(models.ResumenDiario).where(clave).values(
+            total=models.ResumenDiario.total + total,
+            cantidad=models.ResumenDiario.cantidad + cantidad
+        ).execution_options(synchronize_session=False)
+
+        if db.execute(incremento).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.ResumenDiario).values(
+                    fecha=fecha, tipo=tipo, metodo_pago=metodo_pago, total=total, cantidad=cantidad
+                ))
+        except IntegrityError:
+            db.execute(incremento)
+
+
+def sumar_venta(db: Session, total: float, metodo_pago: str, momento: Optional[datetime] = None) -> None:
+    sumar(db, {(fecha_de(momento), "venta", metodo_pago): (total, 1)})
+
+
+def sumar_retiro(db: Session, total: float, momento: Optional[datetime] = None) -> None:
+    sumar(db, {(fecha_de(momento), "retiro", ""): (total, 1)})
+
+
+def del_dia(db: Session, fecha: date) -> dict:
+    """Totales de un día: ventas (también por método de pago) y retiros"""
+    resultado = {"ventas": 0, "cantidad_ventas": 0, "por_metodo_pago": {}, "retiros": 0, "cantidad_retiros": 0}
+    filas = db.query(
+        models.ResumenDiario.tipo,
+        models.ResumenDiario.metodo_pago,
+        models.ResumenDiario.total,
+        models.ResumenDiario.cantidad
+    ).filter(models.ResumenDiario.fecha == fecha)
+
+    for tipo, metodo_pago, total, cantidad in filas:
+        if tipo == "venta":
+            resultado["ventas"] += total
+            resultado["cantidad_ventas"] += cantidad
+            resultado["por_metodo_pago"][metodo_pago] = total
+        else:
+            resultado["retiros"] += total
+            resultado["cantidad_retiros"] += cantidad
+    return resultado
+
+
+def reconstruir(db: Session) -> int:
+    """Recalcular todo el resumen desde ventas y retiros. Retorna las filas generadas.
+
+    Acepta una sesión o una conexión (la usa la migración 6).
+    """
+    columnas = ["fecha", "tipo", "metodo_pago", "total", "cantidad"]
+    ventas = select(
+        func.date(models.Venta.created_at),
+        literal("venta"),
+        models.Venta.metodo_pago,
+        func.sum(models.Venta.total),
+        func.count(models.Venta.id)
+    ).group_by(func.date(models.Venta.created_at), models.Venta.metodo_pago)
+    retiros = select(
+        func.date(models.Retiro.created_at),
+        literal("retiro"),
+        literal(""),
+        func.sum(models.Retiro.total),
+        func.count(models.Retiro.id)
+    ).group_by(func.date(models.Retiro.created_at))
+
+    db.execute(delete(models.ResumenDiario))
+    db.execute(insert(models.ResumenDiario).from_select(columnas, ventas))
+    db.execute(insert(models.ResumenDiario).from_select(columnas, retiros))
+    filas = db.scalar(select(func.count()).select_from(models.ResumenDiario))
+    db.commit()
+    return filas
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -52,15 +52,44 @@ class ProductoSearch(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductosCambios(BaseModel):
+    cursor: str
+    productos: List[ProductoResponse]
+
+class AjusteStockItem(BaseModel):
+    producto_id: Optional[int] = Field(None, gt=0)
+    codigo: Optional[str] = Field(None, min_length=1, max_length=100)
+    delta: int
+    
+    @model_validator(mode="after")
+    def validar_identificador(self):
+        if (self.producto_id is None) == (self.codigo is None):
+            raise ValueError("Indique producto_id o codigo (solo uno)")
+        return self
+
+class AjusteStockCreate(BaseModel):
+    items: List[AjusteStockItem] = Field(..., min_length=1, max_length=1000)
+    tipo: str = Field(default="reposicion", pattern="^(reposicion|ajuste)$")
+
 # Schemas de Ventas
 class VentaItemCreate(BaseModel):
-    producto_id: int
+    producto_id: Optional[int] = None
+    # Alternativa a producto_id: código escaneado en caja
+    codigo: Optional[str] = Field(None, min_length=1, max_length=100)
     cantidad: int = Field(..., gt=0)
-    precio_unitario: float = Field(..., ge=0)
+    # Si se omite, se usa el precio de venta actual del producto
+    precio_unitario: Optional[float] = Field(None, ge=0)
+    
+    @model_validator(mode="after")
+    def validar_identificador(self):
+        if self.producto_id is None and self.codigo is None:
+            raise ValueError("Indique producto_id o codigo")
+        return self
 
 class VentaItemResponse(BaseModel):
     id: int
     producto_id: int
+    producto_nombre: Optional[str] = None
     cantidad: int
     precio_unitario: float
     subtotal: float
@@ -82,6 +111,27 @@ class VentaResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class VentaBatchItem(VentaCreate):
+    # Clave propia de cada venta encolada, para que reenviar el lote sea seguro
+    idempotency_key: Optional[str] = Field(None, max_length=100)
+    # Momento real de la venta en la terminal (si se omite, se usa la hora del servidor)
+    created_at: Optional[datetime] = None
+
+class VentaBatchCreate(BaseModel):
+    ventas: List[VentaBatchItem] = Field(..., min_length=1, max_length=1000)
+
+class VentaBatchResultado(BaseModel):
+    indice: int
+    ok: bool
+    venta_id: Optional[int] = None
+    repetida: bool = False
+    error: Optional[str] = None
+
+class VentaBatchResponse(BaseModel):
+    procesadas: int
+    fallidas: int
+    resultados: List[VentaBatchResultado]
+
 class VentasList(BaseModel):
     id: int
     total: float
@@ -91,6 +141,34 @@ class VentasList(BaseModel):
     class Config:
         from_attributes = True
 
+# ============== INVENTARIO ==============
+class StockEnFecha(BaseModel):
+    producto_id: int
+    fecha: datetime
+    stock: int
+
+# ============== REPORTES ==============
+class ReporteVentasFila(BaseModel):
+    periodo: str
+    grupo: Optional[str] = None
+    grupo_id: Optional[int] = None  # id del producto cuando group_by=producto
+    unidades: int
+    ingresos: float
+    costo: float
+    margen: float
+    margen_pct: Optional[float] = None
+
+class ReporteVentas(BaseModel):
+    bucket: str
+    group_by: Optional[str] = None
+    desde: datetime
+    hasta: datetime
+    filas: List[ReporteVentasFila]
+    unidades: int
+    ingresos: float
+    costo: float
+    margen: float
+
 # ============== RETIROS ==============
 class RetiroItemCreate(BaseModel):
     producto_id: int = Field(..., gt=0)
@@ -99,6 +177,7 @@ class RetiroItemCreate(BaseModel):
 class RetiroItemResponse(BaseModel):
     id: int
     producto_id: int
+    producto_nombre: Optional[str] = None
     cantidad: int
     precio_unitario: float
     subtotal: float
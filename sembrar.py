@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Cargar los productos básicos de ejemplo en una base vacía.
+
+Antes esto ocurría al importar main.py en cada worker; ahora es un comando
+explícito (no hace nada si ya hay productos):
+    python sembrar.py
+"""
+
+import models
+import migraciones
+from database import engine, SessionLocal
+
+PRODUCTOS_BASICOS = [
+    {"codigo": "PISCO001", "nombre": "Pisco Alto del Carmen 35°", "precio_compra": 5500, "precio_venta": 6990, "stock": 12, "categoria": "Licores", "marca": "Alto del Carmen", "litros": 1.0},
+    {"codigo": "VODKA001", "nombre": "Vodka Absolut", "precio_compra": 11990, "precio_venta": 14990, "stock": 8, "categoria": "Licores", "marca": "Absolut", "litros": 1.0},
+    {"codigo": "RON001", "nombre": "Ron Bacardi Blanco", "precio_compra": 6990, "precio_venta": 8990, "stock": 10, "categoria": "Licores", "marca": "Bacardi", "litros": 1.0}
+]
+
+
+def sembrar() -> int:
+    """Crear los productos básicos si no hay ninguno; retorna cuántos se crearon"""
+    migraciones.migrar(engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Producto.id).first() is not None:
+            return 0
+        db.add_all([models.Producto(**datos) for datos in PRODUCTOS_BASICOS])
+        db.commit()
+        return len(PRODUCTOS_BASICOS)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    creados = sembrar()
+    print(f"✅ {creados} productos de ejemplo creados" if creados else "✓ Ya existen productos, no se agregó nada")
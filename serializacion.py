@@ -0,0 +1,68 @@
+"""
+Camino rápido de lectura para listados grandes (catálogo de productos).
+
+En vez de hidratar objetos ORM, validarlos con Pydantic y codificarlos con
+el json estándar, se seleccionan solo las columnas pedidas como tuplas y se
+codifican directo con orjson. Los esquemas de schemas.py siguen definiendo
+qué columnas son públicas (y documentando la respuesta en OpenAPI).
+
+orjson es opcional: sin él se usa json estándar con el mismo formato.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+def _por_defecto(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def dumps(contenido) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":"), default=_por_defecto).encode("utf-8")
+
+
+class RespuestaJSON(Response):
+    """JSONResponse sin validación ni jsonable_encoder: el contenido ya viene en tipos básicos"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def columnas(modelo, esquema, fields: Optional[str]) -> list:
+    """Columnas del modelo para una proyección ``fields=a,b,c`` (por defecto todas las del esquema).
+
+    El id siempre se incluye: lo usa la paginación por cursor.
+    """
+    permitidos = list(esquema.model_fields)
+    if fields:
+        pedidos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        desconocidos = [campo for campo in pedidos if campo not in permitidos]
+        if desconocidos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(permitidos)}"
+            )
+    else:
+        pedidos = permitidos
+    nombres = ["id"] + [campo for campo in dict.fromkeys(pedidos) if campo != "id"]
+    return [getattr(modelo, nombre) for nombre in nombres]
+
+
+def filas(columnas_consulta: list, resultado) -> list:
+    """Tuplas de la consulta a dicts listos para dumps()"""
+    nombres = [columna.key for columna in columnas_consulta]
+    return [dict(zip(nombres, fila)) for fila in resultado]
@@ -6,7 +6,8 @@ const state = {
     selectedPaymentMethod: 'efectivo',
     editingProductId: null,
     selectedProduct: null,
-    currentView: 'pos'
+    currentView: 'pos',
+    ventaIdempotencyKey: null
 };
 
 const API_URL = '/api';
@@ -313,11 +314,17 @@ async function processPayment() {
     };
     
     try {
+        // Reutilizar la clave si el intento anterior falló por red
+        state.ventaIdempotencyKey = state.ventaIdempotencyKey || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
         const response = await fetch(`${API_URL}/ventas`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': state.ventaIdempotencyKey
+            },
             body: JSON.stringify(venta)
         });
+        state.ventaIdempotencyKey = null;
         
         if (response.ok) {
             const ventaCreada = await response.json();
@@ -349,9 +356,11 @@ async function handleQuickScan() {
     }
 
     try {
-        const response = await fetch(`${API_URL}/productos?limit=500`);
-        const productos = await response.json();
-        const producto = productos.find(p => p.codigo.toLowerCase() === codigo.toLowerCase() && p.activo);
+        const response = await fetch(`${API_URL}/productos/codigo/${encodeURIComponent(codigo)}`);
+        if (!response.ok && response.status !== 404) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const producto = response.ok ? await response.json() : null;
         
         if (producto) {
             // Producto existe - Mostrar modal para agregar stock
@@ -415,20 +424,23 @@ async function handleAddStock(e) {
         return;
     }
     
-    const newStock = producto.stock + quantityToAdd;
-    
     try {
-        const response = await fetch(`${API_URL}/productos/${producto.id}`, {
-            method: 'PUT',
+        // Incremento en el servidor: no pisa ventas concurrentes
+        const response = await fetch(`${API_URL}/productos/stock`, {
+            method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ stock: newStock })
+            body: JSON.stringify({ items: [{ producto_id: producto.id, delta: quantityToAdd }] })
         });
         
         if (response.ok) {
+            const actualizados = await response.json();
+            actualizados.forEach(actualizado => {
+                const index = state.productos.findIndex(p => p.id === actualizado.id);
+                if (index >= 0) state.productos[index] = actualizado;
+            });
             alert(`✅ Stock actualizado: ${producto.nombre} (+${quantityToAdd})`);
             closeStockModal();
-            await loadProducts();
-            loadProductsTable();
+            renderProductsTable(state.productos.filter(p => p.activo));
             renderPOSProducts();
         } else {
             alert('❌ Error al actualizar el stock');
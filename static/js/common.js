@@ -15,6 +15,7 @@ const state = {
     currentView: 'pos',
     quickModeActive: false,
     discountAmount: 0,
+    catalogCursor: null,
     cashBox: {
         isOpen: false,
         initialAmount: 0,
@@ -143,6 +144,112 @@ async function loadProductos() {
     }
 }
 
+// Reemplaza en state.productos las filas devueltas por el servidor (sin recargar el catálogo)
+function patchProductos(productos) {
+    productos.forEach(actualizado => {
+        const index = state.productos.findIndex(p => p.id === actualizado.id);
+        if (index >= 0) {
+            state.productos[index] = actualizado;
+        } else {
+            state.productos.push(actualizado);
+        }
+    });
+    return state.productos;
+}
+
+// Trae solo los productos que cambiaron desde el último cursor (state.catalogCursor).
+// Retorna false si aún no hay cursor y se necesita una carga completa.
+async function syncProductos() {
+    if (!state.catalogCursor) return false;
+    
+    const cambios = await fetchAPI(`/productos/changes?since=${encodeURIComponent(state.catalogCursor)}`);
+    patchProductos(cambios.productos);
+    state.catalogCursor = cambios.cursor;
+    if (cambios.productos.length > 0) {
+        console.log(`🔄 ${cambios.productos.length} productos actualizados`);
+    }
+    return true;
+}
+
+// Lectura de código de barras: un solo producto desde el servidor, null si no existe
+async function buscarPorCodigo(codigo) {
+    const response = await fetch(`${API_URL}/productos/codigo/${encodeURIComponent(codigo)}`);
+    if (response.status === 404) return null;
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return await response.json();
+}
+
+// Suma/resta stock en el servidor: [{ producto_id | codigo, delta }]
+async function ajustarStock(items, tipo = 'reposicion') {
+    const actualizados = await fetchAPI('/productos/stock', {
+        method: 'POST',
+        body: JSON.stringify({ items, tipo })
+    });
+    patchProductos(actualizados);
+    return actualizados;
+}
+
+// ============== EVENTOS EN VIVO ==============
+// Cambios de stock/precios y movimientos de otras terminales vía /api/eventos (SSE).
+// onProductos() se llama después de aplicar los cambios en state.productos;
+// onMovimiento(tipo, datos) con cada venta o retiro nuevo.
+function suscribirEventos({ onProductos, onMovimiento } = {}) {
+    if (!window.EventSource) return null;
+    
+    const fuente = new EventSource(`${API_URL}/eventos`);
+    const notificar = () => { if (onProductos) onProductos(); };
+    const resincronizar = async () => {
+        try {
+            if (await syncProductos()) notificar();
+        } catch (error) {
+            console.error('Error resincronizando productos:', error);
+        }
+    };
+    
+    // Al (re)conectar se trae lo que haya cambiado mientras no había conexión
+    fuente.addEventListener('open', resincronizar);
+    fuente.addEventListener('resync', resincronizar);
+    
+    fuente.addEventListener('stock', (e) => {
+        JSON.parse(e.data).productos.forEach(({ id, stock }) => {
+            const producto = state.productos.find(p => p.id === id);
+            if (producto) producto.stock = stock;
+        });
+        notificar();
+    });
+    fuente.addEventListener('producto', (e) => {
+        patchProductos([JSON.parse(e.data)]);
+        notificar();
+    });
+    ['venta', 'retiro'].forEach(tipo => {
+        fuente.addEventListener(tipo, (e) => {
+            if (onMovimiento) onMovimiento(tipo, JSON.parse(e.data));
+        });
+    });
+    
+    return fuente;
+}
+
+// ============== IDEMPOTENCIA ==============
+// Una clave por intento de venta/retiro: se reutiliza si la petición falla
+// por red (timeout) y se descarta en cuanto el servidor responde.
+const pendingIdempotencyKeys = {};
+
+function getIdempotencyKey(scope) {
+    if (!pendingIdempotencyKeys[scope]) {
+        pendingIdempotencyKeys[scope] = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+    return pendingIdempotencyKeys[scope];
+}
+
+function clearIdempotencyKey(scope) {
+    delete pendingIdempotencyKeys[scope];
+}
+
 // ============== NOTIFICACIONES ==============
 function showNotification(message, type = 'info', duration = 3000) {
     // Crear contenedor de notificaciones si no existe
@@ -335,6 +442,13 @@ window.formatDate = formatDate;
 window.formatTime = formatTime;
 window.fetchAPI = fetchAPI;
 window.loadProductos = loadProductos;
+window.patchProductos = patchProductos;
+window.syncProductos = syncProductos;
+window.ajustarStock = ajustarStock;
+window.buscarPorCodigo = buscarPorCodigo;
+window.suscribirEventos = suscribirEventos;
+window.getIdempotencyKey = getIdempotencyKey;
+window.clearIdempotencyKey = clearIdempotencyKey;
 window.showNotification = showNotification;
 window.validateProductForm = validateProductForm;
 window.filterProducts = filterProducts;
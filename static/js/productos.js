@@ -383,20 +383,13 @@ async function showAddStockModal(productoId) {
     }
     
     try {
-        const nuevoStock = producto.stock + cantidadNum;
-        const response = await fetch(`${API_URL}/productos/${productoId}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ ...producto, stock: nuevoStock })
-        });
+        // Incremento en el servidor: no pisa ventas concurrentes
+        await ajustarStock([{ producto_id: productoId, delta: cantidadNum }]);
         
-        if (response.ok) {
-            showNotification(`Stock actualizado: +${cantidadNum} unidades`, 'success');
-            sound.success();
-            await loadProductsTable();
-        } else {
-            showNotification('Error al actualizar stock', 'error');
-        }
+        showNotification(`Stock actualizado: +${cantidadNum} unidades`, 'success');
+        sound.success();
+        renderProductsTable(state.productos);
+        updateProductStats(state.productos);
     } catch (error) {
         console.error('Error:', error);
         showNotification('Error al actualizar stock', 'error');
@@ -559,6 +559,12 @@ async function loadInitialData() {
         ]);
         console.log('📦 Productos cargados:', state.productos.length);
         
+        // Stock y precios en vivo desde otras terminales (sin recargar el catálogo)
+        suscribirEventos({
+            onProductos: debounce(renderProductosActuales, 200),
+            onMovimiento: debounce(loadEstadisticas, 500)
+        });
+        
         populateMarcasFilter();
         populateUnidadesFilter();
         
@@ -582,6 +588,18 @@ async function loadInitialData() {
     }
 }
 
+// Re-renderizar con state.productos las vistas de productos abiertas
+function renderProductosActuales() {
+    if (document.getElementById('posProductsGrid')) {
+        filterPOSProducts();
+    }
+    if (document.getElementById('productosTable')) {
+        const productosActivos = state.productos.filter(p => p.activo);
+        renderProductsTable(productosActivos);
+        updateProductStats(productosActivos);
+    }
+}
+
 // ============== API CALLS ==============
 async function loadProducts() {
     try {
@@ -687,6 +705,7 @@ async function loadProducts() {
         if (response.ok) {
             // El API devuelve diferentes formatos dependiendo del endpoint
             state.productos = data.productos || data || [];
+            state.catalogCursor = response.headers.get('X-Catalogo-Cursor');
             console.log('✅ Productos cargados:', state.productos.length);
         } else {
             throw new Error('Error en la respuesta del servidor');
@@ -826,6 +845,7 @@ function renderPOSProducts(searchTerm = '') {
     
     if (filtered.length === 0) {
         grid.innerHTML = '<div class="empty-state"><div class="empty-state-icon">📭</div><p>No se encontraron productos</p></div>';
+        if (searchTerm.length >= 3) showPOSSuggestions(searchTerm);
         return;
     }
     
@@ -857,6 +877,40 @@ function renderPOSProducts(searchTerm = '') {
     }).join('');
 }
 
+// Sin coincidencias: pedir sugerencias tolerantes a errores de tipeo ("heinekn", "absolu")
+async function showPOSSuggestions(searchTerm) {
+    try {
+        const sugerencias = await fetchAPI(`/productos/sugerir?q=${encodeURIComponent(searchTerm)}`);
+        const searchInput = document.getElementById('posSearchInput');
+        const grid = document.getElementById('posProductsGrid');
+        
+        // Ignorar la respuesta si el cajero ya siguió escribiendo
+        if (!grid || sugerencias.length === 0) return;
+        if (searchInput && searchInput.value.toLowerCase() !== searchTerm) return;
+        
+        grid.innerHTML = '<div class="empty-state"><p>¿Quisiste decir...?</p></div>' + sugerencias.map(producto => {
+            const outOfStock = producto.stock === 0;
+            return `
+                <div class="product-card-pos ${outOfStock ? 'out-of-stock' : ''}" 
+                     onclick="${outOfStock ? '' : `addToCartQuickMode(${producto.id})`}">
+                    <div class="product-info-list">
+                        <div class="product-name-list">${producto.nombre}</div>
+                        <div class="product-details-list">
+                            <span class="product-code-list">${producto.codigo}</span>
+                            <span class="product-stock-list">
+                                ${outOfStock ? '❌ Sin stock' : `Stock: ${producto.stock}`}
+                            </span>
+                        </div>
+                    </div>
+                    <div class="product-price-list">$${formatPrice(producto.precio_venta)}</div>
+                </div>
+            `;
+        }).join('');
+    } catch (error) {
+        console.error('Error obteniendo sugerencias:', error);
+    }
+}
+
 function populateMarcasFilter() {
     try {
         console.log('Poblando filtro de marcas...');
@@ -1105,9 +1159,7 @@ async function handleQuickScan() {
     }
 
     try {
-        const response = await fetch(`${API_URL}/productos?limit=500`);
-        const productos = await response.json();
-        const producto = productos.find(p => p.codigo.toLowerCase() === codigo.toLowerCase() && p.activo);
+        const producto = await buscarPorCodigo(codigo);
         
         if (producto) {
             // Si estamos en vista productos, editar el producto
@@ -1153,9 +1205,7 @@ async function handleQuickScan() {
     }
 
     try {
-        const response = await fetch(`${API_URL}/productos?limit=500`);
-        const productos = await response.json();
-        const producto = productos.find(p => p.codigo.toLowerCase() === codigo.toLowerCase() && p.activo);
+        const producto = await buscarPorCodigo(codigo);
         
         if (producto) {
             // Producto existe - Mostrar modal para agregar stock
@@ -1238,24 +1288,16 @@ async function handleAddStock(e) {
         return;
     }
     
-    const newStock = producto.stock + quantityToAdd;
-    
     try {
-        const response = await fetch(`${API_URL}/productos/${producto.id}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ stock: newStock })
-        });
+        // Incremento en el servidor: no pisa ventas concurrentes
+        await ajustarStock([{ producto_id: producto.id, delta: quantityToAdd }]);
         
-        if (response.ok) {
-            alert(`✅ Stock actualizado: ${producto.nombre} (+${quantityToAdd})`);
-            closeStockModal();
-            await loadProducts();
-            loadProductsTable();
-            renderPOSProducts();
-        } else {
-            alert('❌ Error al actualizar el stock');
-        }
+        alert(`✅ Stock actualizado: ${producto.nombre} (+${quantityToAdd})`);
+        closeStockModal();
+        const productosActivos = state.productos.filter(p => p.activo);
+        renderProductsTable(productosActivos);
+        updateProductStats(productosActivos);
+        renderPOSProducts();
     } catch (error) {
         console.error('Error:', error);
         alert('❌ Error al actualizar el stock');
@@ -1274,12 +1316,21 @@ function closeStockModal() {
     }
 }
 
+// Sincroniza solo los productos que cambiaron; carga completa si aún no hay cursor
+async function syncProducts() {
+    try {
+        if (await syncProductos()) return;
+    } catch (error) {
+        console.error('Error sincronizando productos, recargando catálogo:', error);
+    }
+    await loadProducts();
+}
+
 // ============== PRODUCTOS - GESTIÓN ==============
 async function loadProductsTable() {
     try {
-        const response = await fetch(`${API_URL}/productos?limit=500`);
-        const productos = await response.json();
-        const productosActivos = productos.filter(p => p.activo);
+        await syncProducts();
+        const productosActivos = state.productos.filter(p => p.activo);
         renderProductsTable(productosActivos);
         updateProductStats(productosActivos);
     } catch (error) {
@@ -1441,8 +1492,7 @@ async function handleProductSubmit(e) {
         if (response.ok) {
             alert(state.editingProductId ? '✅ Producto actualizado' : '✅ Producto creado');
             hideProductForm();
-            await loadProducts();
-            loadProductsTable();
+            await loadProductsTable();
             renderPOSProducts();
         } else {
             const error = await response.json();
@@ -1536,8 +1586,7 @@ async function deleteProduct(id) {
         
         if (response.ok) {
             alert('✅ Producto eliminado');
-            await loadProducts();
-            loadProductsTable();
+            await loadProductsTable();
             renderPOSProducts();
         } else {
             alert('❌ Error al eliminar el producto');
@@ -2028,9 +2077,13 @@ async function processRetiro() {
     try {
         const response = await fetch(`${API_URL}/retiros`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': getIdempotencyKey('retiro')
+            },
             body: JSON.stringify(retiro)
         });
+        clearIdempotencyKey('retiro');
         
         if (response.ok) {
             const retiroCreado = await response.json();
@@ -2039,7 +2092,7 @@ async function processRetiro() {
             // Limpiar carrito y recargar
             state.retiroCart = [];
             renderRetiroCart();
-            await loadProducts();
+            await syncProducts();
             await loadEstadisticas();
             renderRetiroProducts();
             loadRetiros();
@@ -224,6 +224,12 @@ async function loadInitialData() {
         ]);
         console.log('📦 Productos cargados:', state.productos.length);
         
+        // Stock en vivo: ventas y retiros de otras terminales
+        suscribirEventos({
+            onProductos: debounce(filterRetiroProducts, 200),
+            onMovimiento: debounce(loadEstadisticas, 500)
+        });
+        
         populateMarcasFilter();
         populateUnidadesFilter();
         renderRetiroProducts();
@@ -339,6 +345,7 @@ async function loadProducts() {
         if (response.ok) {
             // El API devuelve diferentes formatos dependiendo del endpoint
             state.productos = data.productos || data || [];
+            state.catalogCursor = response.headers.get('X-Catalogo-Cursor');
             console.log('✅ Productos cargados:', state.productos.length);
         } else {
             throw new Error('Error en la respuesta del servidor');
@@ -637,9 +644,13 @@ async function processRetiro() {
     try {
         const response = await fetch(`${API_URL}/retiros`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': getIdempotencyKey('retiro')
+            },
             body: JSON.stringify(retiro)
         });
+        clearIdempotencyKey('retiro');
         
         if (response.ok) {
             const retiroCreado = await response.json();